@@ -6,10 +6,87 @@ import threading
 import os
 import signal
 import shlex
+import argparse
+import asyncio
+import json
+import contextlib
+import math
+import heapq
+import random
+import select
+import socket
+import hashlib
+import resource
+import stat
+import sys
+import tty
+import termios
+import fcntl
+import struct
+import smtplib
+import http.client
+import urllib.parse
+from collections import deque
+from enum import Enum
+import selectors
+import queue
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from email.message import EmailMessage
+
+YAML_LOADER = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
 
 LOGFILE = "logs.log"
+LOG_MAX_BYTES = 10 * 1024 * 1024
+LOG_BACKUPS = 3
+EVENTS_DIR = "events"
+EVENTS_SEGMENT_BYTES = 4 * 1024 * 1024
+EVENTS_RETENTION_DAYS = 7
+EVENTS_BUCKET = 300
+SPAWN_PARALLELISM = 16
+DEFAULT_PRIORITY = 999
+OUTPUT_MAX_BYTES = 10 * 1024 * 1024
+OUTPUT_BACKUPS = 3
+OUTPUT_PENDING_LIMIT = 1024 * 1024
+TAIL_BUFFER = 64 * 1024
+METRICS_INTERVAL = 5
+METRICS_HISTORY = 60
+FD_COUNT_EVERY = 6
+CLK_TCK = os.sysconf("SC_CLK_TCK")
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+RESTART_FIELDS = frozenset(("cmd", "env", "workingdir", "umask", "stdout", "stderr",
+                            "socket", "socket_reuseport", "socket_backlog", "console"))
 CONFILE = "conf.yaml"
+SOCKFILE = "/tmp/taskmaster.sock"
+STATEFILE = "/tmp/taskmaster.state"
+UNKNOWN_EXITCODE = -1
+LISTEN_FDS_START = 3
+PROBE_CONCURRENCY = 256
+HEALTHCHECK_DEFAULTS = {
+    "type": "tcp",
+    "host": "127.0.0.1",
+    "port": None,
+    "port_step": 0,
+    "path": "/",
+    "command": None,
+    "interval": 10,
+    "timeout": 2,
+    "healthy_threshold": 1,
+    "unhealthy_threshold": 3,
+    "grace": None,
+}
+SOCKET_BACKLOG = 128
+FD_RESERVE = 64
+ALERT_EVENTS = ("Started", "Stopped", "Failed", "Restarting")
+ALERT_WINDOW = 30
+ALERT_MAX_EVENTS = 20
+ALERT_TIMEOUT = 10
+ALERT_RETRIES = 5
+ALERT_BACKOFF = 2
+ALERT_QUEUE_LIMIT = 100
+CONSOLE_CLIENT_BUFFER = 256 * 1024
+CONSOLE_INPUT_LIMIT = 64 * 1024
+CONSOLE_ESCAPE = b"\x1d"
 GREEN = "\033[92m"
 RED = "\033[91m"
 YELLOW = "\033[93m"
@@ -18,6 +95,2125 @@ RESET = "\033[0m"
 
 
 
+class ConfigError(ValueError):
+        pass
+
+
+class OutputSink:
+
+        def __init__(self, path, max_bytes=OUTPUT_MAX_BYTES, backups=OUTPUT_BACKUPS,
+                     limit=OUTPUT_PENDING_LIMIT):
+            self.path = path
+            self.max_bytes = max_bytes
+            self.backups = backups
+            self.limit = limit
+            self.pending = bytearray()
+            self.dropped = 0
+            self.file = None
+            self.lock = threading.Lock()
+            self.write_lock = threading.Lock()
+
+        def append(self, data):
+            with self.lock:
+                self.pending += data
+                excess = len(self.pending) - self.limit
+                if excess > 0:
+                    del self.pending[:excess]
+                    self.dropped += excess
+
+        def flush(self):
+            with self.write_lock:
+                with self.lock:
+                    if not self.pending:
+                        return
+                    data = bytes(self.pending)
+                    self.pending.clear()
+                try:
+                    if self.file is None:
+                        self.file = open(self.path, "ab")
+                    size = self.file.tell()
+                    if self.max_bytes and size and size + len(data) > self.max_bytes:
+                        self.file.close()
+                        self.file = None
+                        rotate_file(self.path, self.backups)
+                        self.file = open(self.path, "ab")
+                    self.file.write(data)
+                    self.file.flush()
+                except OSError:
+                    self.dropped += len(data)
+
+        def close(self):
+            self.flush()
+            with self.write_lock:
+                if self.file is not None:
+                    self.file.close()
+                    self.file = None
+
+
+class OutputCapture:
+
+        def __init__(self, flush_interval=0.2):
+            self.flush_interval = flush_interval
+            self.selector = selectors.DefaultSelector()
+            self.wake_r, self.wake_w = os.pipe()
+            os.set_blocking(self.wake_r, False)
+            os.set_blocking(self.wake_w, False)
+            self.selector.register(self.wake_r, selectors.EVENT_READ, None)
+            self.buffers = {}
+            self.sinks = {}
+            self.lock = threading.Lock()
+            self.flush_event = threading.Event()
+            self.running = False
+            self.threads = []
+
+        def start(self):
+            with self.lock:
+                if self.running:
+                    return
+                self.running = True
+                self.threads = [threading.Thread(target=self._reader, daemon=True),
+                                threading.Thread(target=self._writer, daemon=True)]
+            for thread in self.threads:
+                thread.start()
+
+        def sink(self, path, max_bytes=OUTPUT_MAX_BYTES, backups=OUTPUT_BACKUPS):
+            path = os.path.abspath(str(path))
+            with self.lock:
+                sink = self.sinks.get(path)
+                if sink is None:
+                    sink = self.sinks[path] = OutputSink(path)
+                sink.max_bytes = int(max_bytes)
+                sink.backups = int(backups)
+                return sink
+
+        def open_pipe(self, prog, index, stream, sink=None, tail_size=TAIL_BUFFER):
+            self.start()
+            read_fd, write_fd = os.pipe()
+            os.set_blocking(read_fd, False)
+            key = (prog, index, stream)
+            with self.lock:
+                if key not in self.buffers:
+                    self.buffers[key] = bytearray()
+            self.selector.register(read_fd, selectors.EVENT_READ, (key, sink, int(tail_size)))
+            return write_fd
+
+        def _read(self, fd, data):
+            key, sink, tail_size = data
+            try:
+                chunk = os.read(fd, 65536)
+            except BlockingIOError:
+                return False
+            except OSError:
+                chunk = b""
+            if not chunk:
+                self.selector.unregister(fd)
+                os.close(fd)
+                return False
+            with self.lock:
+                buf = self.buffers.setdefault(key, bytearray())
+                buf += chunk
+                if len(buf) > tail_size:
+                    del buf[:len(buf) - tail_size]
+            if sink is not None:
+                sink.append(chunk)
+                if len(sink.pending) >= 65536:
+                    self.flush_event.set()
+            return True
+
+        def _reader(self):
+            while self.running:
+                for key, _ in self.selector.select():
+                    if key.data is None:
+                        try:
+                            while os.read(self.wake_r, 4096):
+                                pass
+                        except (BlockingIOError, OSError):
+                            pass
+                        continue
+                    self._read(key.fd, key.data)
+
+        def _writer(self):
+            while self.running:
+                self.flush_event.wait(self.flush_interval)
+                self.flush_event.clear()
+                self.flush()
+
+        def flush(self):
+            for sink in list(self.sinks.values()):
+                sink.flush()
+
+        def drain(self):
+            for key in list(self.selector.get_map().values()):
+                if key.data is None:
+                    continue
+                while self._read(key.fd, key.data):
+                    pass
+
+        def tail(self, prog, index, stream="stdout", lines=20):
+            with self.lock:
+                data = bytes(self.buffers.get((prog, index, stream), b""))
+            text = data.decode(errors="replace")
+            if lines:
+                text = "\n".join(text.splitlines()[-int(lines):])
+            return text
+
+        def forget(self, prog):
+            with self.lock:
+                for key in [k for k in self.buffers if k[0] == prog]:
+                    del self.buffers[key]
+
+        def close(self):
+            self.running = False
+            try:
+                os.write(self.wake_w, b"\0")
+            except OSError:
+                pass
+            self.flush_event.set()
+            for thread in self.threads:
+                thread.join(5)
+            self.threads = []
+            self.drain()
+            for sink in list(self.sinks.values()):
+                sink.close()
+
+
+class Console:
+
+        __slots__ = ("key", "fd", "sink", "scrollback", "limit", "clients", "pending", "events")
+
+        def __init__(self, key, fd, sink, scrollback, limit):
+            self.key = key
+            self.fd = fd
+            self.sink = sink
+            self.scrollback = scrollback
+            self.limit = limit
+            self.clients = set()
+            self.pending = bytearray()
+            self.events = 0
+
+
+class ConsoleClient:
+
+        __slots__ = ("sock", "console", "pending", "dropped", "events")
+
+        def __init__(self, sock, console):
+            self.sock = sock
+            self.console = console
+            self.pending = bytearray()
+            self.dropped = 0
+            self.events = 0
+
+
+class ConsoleMux:
+
+        def __init__(self, client_limit=CONSOLE_CLIENT_BUFFER, input_limit=CONSOLE_INPUT_LIMIT):
+            self.client_limit = client_limit
+            self.input_limit = input_limit
+            self.selector = selectors.DefaultSelector()
+            self.wake_r, self.wake_w = os.pipe()
+            os.set_blocking(self.wake_r, False)
+            os.set_blocking(self.wake_w, False)
+            self.selector.register(self.wake_r, selectors.EVENT_READ, None)
+            self.consoles = {}
+            self.scrollbacks = {}
+            self.calls = deque()
+            self.lock = threading.Lock()
+            self.running = False
+            self.thread = None
+
+        def start(self):
+            with self.lock:
+                if self.running:
+                    return
+                self.running = True
+                self.thread = threading.Thread(target=self._run, daemon=True)
+            self.thread.start()
+
+        def _call(self, callback, *args):
+            self.calls.append((callback, args))
+            try:
+                os.write(self.wake_w, b"\0")
+            except OSError:
+                pass
+
+        def open(self, prog, index, sink=None, scrollback=TAIL_BUFFER):
+            self.start()
+            master, slave = os.openpty()
+            os.set_blocking(master, False)
+            key = (prog, index)
+            with self.lock:
+                buf = self.scrollbacks.setdefault(key, bytearray())
+                console = Console(key, master, sink, buf, int(scrollback))
+                stale = self.consoles.get(key)
+                self.consoles[key] = console
+            if stale is not None:
+                self._call(self._retire, stale)
+            self._call(self._register, console)
+            return slave
+
+        def _register(self, console):
+            if self.consoles.get(console.key) is console:
+                self._update(console.fd, console, selectors.EVENT_READ)
+
+        def attach(self, prog, index, sock, rows=None, cols=None):
+            sock.setblocking(False)
+            self._call(self._attach, (prog, index), sock, rows, cols)
+
+        def _attach(self, key, sock, rows, cols):
+            console = self.consoles.get(key)
+            if console is None:
+                sock.close()
+                return
+            if rows and cols:
+                with contextlib.suppress(OSError):
+                    fcntl.ioctl(console.fd, termios.TIOCSWINSZ, struct.pack("HHHH", int(rows), int(cols), 0, 0))
+            client = ConsoleClient(sock, console)
+            console.clients.add(client)
+            self._update(sock, client, selectors.EVENT_READ)
+            with self.lock:
+                self._send(client, bytes(console.scrollback))
+
+        def _update(self, fileobj, item, events):
+            if item.events == events:
+                return
+            if not events:
+                self.selector.unregister(fileobj)
+            elif not item.events:
+                self.selector.register(fileobj, events, item)
+            else:
+                self.selector.modify(fileobj, events, item)
+            item.events = events
+
+        def _send(self, client, data):
+            client.pending += data
+            excess = len(client.pending) - self.client_limit
+            if excess > 0:
+                del client.pending[:excess]
+                client.dropped += excess
+            self._flush_client(client)
+
+        def _flush_client(self, client):
+            if client.pending:
+                try:
+                    sent = client.sock.send(client.pending)
+                except (BlockingIOError, InterruptedError):
+                    sent = 0
+                except OSError:
+                    self._detach(client)
+                    return
+                del client.pending[:sent]
+            events = selectors.EVENT_READ
+            if client.pending:
+                events |= selectors.EVENT_WRITE
+            if len(client.console.pending) >= self.input_limit:
+                events &= ~selectors.EVENT_READ
+            self._update(client.sock, client, events)
+
+        def _read_client(self, client):
+            try:
+                data = client.sock.recv(65536)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError:
+                data = b""
+            if not data:
+                self._detach(client)
+                return
+            console = client.console
+            console.pending += data
+            self._flush_console(console)
+
+        def _flush_console(self, console):
+            if console.pending:
+                try:
+                    written = os.write(console.fd, console.pending)
+                except (BlockingIOError, InterruptedError):
+                    written = 0
+                except OSError:
+                    written = len(console.pending)
+                del console.pending[:written]
+            self._update(console.fd, console, selectors.EVENT_READ | (selectors.EVENT_WRITE if console.pending else 0))
+            if len(console.pending) < self.input_limit:
+                for client in list(console.clients):
+                    if not client.events & selectors.EVENT_READ:
+                        self._flush_client(client)
+
+        def _read_console(self, console):
+            try:
+                chunk = os.read(console.fd, 65536)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError:
+                chunk = b""
+            if not chunk:
+                self._close_console(console)
+                return
+            self._capture(console, chunk)
+
+        def _capture(self, console, chunk):
+            with self.lock:
+                buf = console.scrollback
+                buf += chunk
+                if len(buf) > console.limit:
+                    del buf[:len(buf) - console.limit]
+            if console.sink is not None:
+                console.sink.append(chunk)
+            for client in list(console.clients):
+                self._send(client, chunk)
+
+        def _detach(self, client):
+            client.console.clients.discard(client)
+            self._update(client.sock, client, 0)
+            client.sock.close()
+
+        def _retire(self, console):
+            while console.fd >= 0:
+                try:
+                    chunk = os.read(console.fd, 65536)
+                except OSError:
+                    chunk = b""
+                if not chunk:
+                    break
+                self._capture(console, chunk)
+            self._close_console(console)
+
+        def _close_console(self, console):
+            if console.fd < 0:
+                return
+            for client in list(console.clients):
+                with contextlib.suppress(OSError):
+                    client.sock.send(bytes(client.pending) + b"\r\n[process exited]\r\n")
+                self._detach(client)
+            self._update(console.fd, console, 0)
+            os.close(console.fd)
+            console.fd = -1
+            with self.lock:
+                if self.consoles.get(console.key) is console:
+                    del self.consoles[console.key]
+
+        def _run(self):
+            while self.running:
+                for key, events in self.selector.select():
+                    item = key.data
+                    if item is None:
+                        with contextlib.suppress(BlockingIOError, OSError):
+                            while os.read(self.wake_r, 4096):
+                                pass
+                    elif isinstance(item, Console):
+                        if self.consoles.get(item.key) is not item:
+                            self._retire(item)
+                            continue
+                        if events & selectors.EVENT_WRITE:
+                            self._flush_console(item)
+                        if events & selectors.EVENT_READ and self.consoles.get(item.key) is item:
+                            self._read_console(item)
+                    else:
+                        if events & selectors.EVENT_WRITE:
+                            self._flush_client(item)
+                        if events & selectors.EVENT_READ and item in item.console.clients:
+                            self._read_client(item)
+                while self.calls:
+                    callback, args = self.calls.popleft()
+                    callback(*args)
+            for console in list(self.consoles.values()):
+                self._close_console(console)
+
+        def has(self, prog, index):
+            return (prog, index) in self.consoles
+
+        def set_scrollback(self, prog, size):
+            with self.lock:
+                for console in self.consoles.values():
+                    if console.key[0] == prog:
+                        console.limit = int(size)
+
+        def tail(self, prog, index, lines=20):
+            with self.lock:
+                data = bytes(self.scrollbacks.get((prog, index), b""))
+            text = data.decode(errors="replace").replace("\r\n", "\n")
+            if lines:
+                text = "\n".join(text.splitlines()[-int(lines):])
+            return text
+
+        def forget(self, prog):
+            with self.lock:
+                for key in [k for k in self.scrollbacks if k[0] == prog and k not in self.consoles]:
+                    del self.scrollbacks[key]
+
+        def close(self):
+            self.running = False
+            self._call(lambda: None)
+            if self.thread is not None:
+                self.thread.join(5)
+            self.thread = None
+
+
+def console_session(sock, escape=CONSOLE_ESCAPE):
+    stdin = sys.stdin.fileno()
+    stdout = sys.stdout.fileno()
+    saved = termios.tcgetattr(stdin) if os.isatty(stdin) else None
+    print(f"{CYAN}Attached. Press Ctrl-] to detach.{RESET}\r")
+    try:
+        if saved is not None:
+            tty.setraw(stdin)
+        while True:
+            readable, _, _ = select.select([stdin, sock], [], [])
+            if sock in readable:
+                data = sock.recv(65536)
+                if not data:
+                    break
+                os.write(stdout, data)
+            if stdin in readable:
+                data = os.read(stdin, 1024)
+                if not data or escape in data:
+                    if data:
+                        sock.sendall(data.split(escape, 1)[0])
+                    break
+                sock.sendall(data)
+    finally:
+        if saved is not None:
+            termios.tcsetattr(stdin, termios.TCSADRAIN, saved)
+        sock.close()
+    print(f"\r\n{CYAN}Detached.{RESET}")
+
+
+class ProcReader:
+
+        __slots__ = ("pid", "path", "fds", "reads")
+
+        def __init__(self, pid):
+            self.pid = pid
+            self.path = f"/proc/{pid}"
+            self.fds = -1
+            self.reads = 0
+
+        def _read(self, name, size):
+            fd = os.open(f"{self.path}/{name}", os.O_RDONLY)
+            try:
+                return os.read(fd, size)
+            finally:
+                os.close(fd)
+
+        def read(self):
+            stat = self._read("stat", 4096)
+            statm = self._read("statm", 256)
+            fields = stat[stat.rindex(b")") + 2:].split()
+            cpu_ticks = int(fields[11]) + int(fields[12])
+            if self.reads % FD_COUNT_EVERY == 0:
+                try:
+                    self.fds = len(os.listdir(f"{self.path}/fd"))
+                except PermissionError:
+                    pass
+            self.reads += 1
+            return cpu_ticks / CLK_TCK, int(statm.split()[1]) * PAGE_SIZE, self.fds, int(fields[17])
+
+
+class MetricsSampler:
+
+        def __init__(self, taskmaster, interval=METRICS_INTERVAL, history=METRICS_HISTORY):
+            self.Taskmaster = taskmaster
+            self.interval = interval
+            self.history = history
+            self.readers = {}
+            self.previous = {}
+            self.samples = {}
+            self.latest = {}
+            self.thread = None
+            self.stop_event = threading.Event()
+            self.last_duration = 0.0
+
+        def configure(self, interval=None, history=None):
+            if interval is not None:
+                self.interval = float(interval)
+            if history is not None:
+                self.history = int(history)
+
+        def start(self):
+            if self.thread is None and self.interval > 0:
+                self.thread = threading.Thread(target=self._run, daemon=True)
+                self.thread.start()
+
+        def stop(self):
+            self.stop_event.set()
+            if self.thread is not None:
+                self.thread.join(5)
+                self.thread = None
+            self.readers = {}
+
+        def _run(self):
+            while not self.stop_event.wait(self.interval):
+                self.sample()
+
+        def sample(self):
+            began = time.perf_counter()
+            now = time.monotonic()
+            wall = time.time()
+            latest = {}
+            seen = set()
+            for state in list(self.Taskmaster.programs.values()):
+                for inst in list(state.instances.values()):
+                    if inst.state not in ALIVE_STATES:
+                        continue
+                    pid = inst.pid
+                    seen.add(pid)
+                    try:
+                        reader = self.readers.get(pid)
+                        if reader is None:
+                            reader = self.readers[pid] = ProcReader(pid)
+                        cpu_time, rss, fds, threads = reader.read()
+                    except (OSError, ValueError, IndexError):
+                        continue
+                    prev = self.previous.get(pid)
+                    cpu = 0.0
+                    if prev is not None and now > prev[0]:
+                        cpu = 100.0 * (cpu_time - prev[1]) / (now - prev[0])
+                    self.previous[pid] = (now, cpu_time)
+                    sample = {
+                        "time": wall,
+                        "cpu": round(cpu, 2),
+                        "cpu_time": cpu_time,
+                        "rss": rss,
+                        "fds": fds,
+                        "threads": threads,
+                        "uptime": round(wall - inst.start_time, 1),
+                    }
+                    key = (state.name, inst.index)
+                    ring = self.samples.get(key)
+                    if ring is None or ring.maxlen != self.history:
+                        ring = self.samples[key] = deque(ring or (), maxlen=self.history)
+                    ring.append(sample)
+                    latest[pid] = sample
+                    self.Taskmaster.check_limits(state, inst, ring)
+            for pid in [p for p in self.readers if p not in seen]:
+                self.readers.pop(pid)
+                self.previous.pop(pid, None)
+            self.latest = latest
+            self.last_duration = time.perf_counter() - began
+            return len(latest)
+
+        def history_for(self, prog, index):
+            return list(self.samples.get((prog, index), ()))
+
+        def forget(self, prog):
+            for key in [k for k in self.samples if k[0] == prog]:
+                del self.samples[key]
+
+
+async def probe_tcp(host, port, timeout):
+    try:
+        _, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+    except asyncio.TimeoutError:
+        return False, "connect timed out"
+    except OSError as e:
+        return False, e.strerror or str(e)
+    writer.close()
+    return True, "connected"
+
+
+async def probe_http(host, port, path, timeout):
+    async def request():
+        reader, writer = await asyncio.open_connection(host, port)
+        try:
+            writer.write(f"GET {path} HTTP/1.0\r\nHost: {host}:{port}\r\nConnection: close\r\n\r\n".encode())
+            await writer.drain()
+            return await reader.readline()
+        finally:
+            writer.close()
+
+    try:
+        line = await asyncio.wait_for(request(), timeout)
+    except asyncio.TimeoutError:
+        return False, "request timed out"
+    except OSError as e:
+        return False, e.strerror or str(e)
+    parts = line.split()
+    if len(parts) < 2 or not parts[1].isdigit():
+        return False, "invalid HTTP response"
+    code = int(parts[1])
+    return 200 <= code < 400, f"HTTP {code}"
+
+
+async def probe_exec(command, timeout, env=None, cwd=None):
+    try:
+        proc = await asyncio.create_subprocess_exec(
+            *shlex.split(command), stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL, env=env, cwd=cwd)
+    except OSError as e:
+        return False, e.strerror or str(e)
+    try:
+        code = await asyncio.wait_for(proc.wait(), timeout)
+    except asyncio.TimeoutError:
+        proc.kill()
+        await proc.wait()
+        return False, "command timed out"
+    return code == 0, f"exit {code}"
+
+
+class HealthChecker:
+
+        def __init__(self, taskmaster, concurrency=PROBE_CONCURRENCY):
+            self.Taskmaster = taskmaster
+            self.concurrency = concurrency
+            self.loop = None
+            self.thread = None
+            self.semaphore = None
+            self.tasks = {}
+            self.started = threading.Event()
+            self.start_lock = threading.Lock()
+
+        def start(self):
+            with self.start_lock:
+                if self.thread is None:
+                    self.thread = threading.Thread(target=self._run, daemon=True)
+                    self.thread.start()
+            self.started.wait(5)
+
+        def _run(self):
+            self.loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(self.loop)
+            self.semaphore = asyncio.Semaphore(self.concurrency)
+            self.started.set()
+            try:
+                self.loop.run_forever()
+            finally:
+                for task in asyncio.all_tasks(self.loop):
+                    task.cancel()
+                self.loop.run_until_complete(asyncio.sleep(0))
+                self.loop.close()
+
+        def stop(self):
+            if self.loop is not None and self.thread is not None:
+                self.loop.call_soon_threadsafe(self.loop.stop)
+                self.thread.join(5)
+            self.thread = None
+            self.loop = None
+            self.started.clear()
+
+        def watch(self, state, inst):
+            self.start()
+            self.loop.call_soon_threadsafe(self._watch, state, inst)
+
+        def _watch(self, state, inst):
+            if inst not in self.tasks:
+                self.tasks[inst] = self.loop.create_task(self._probe_loop(state, inst))
+
+        def check(self, state, inst, timeout=None):
+            self.start()
+            future = asyncio.run_coroutine_threadsafe(self.probe(state, inst), self.loop)
+            return future.result(timeout)
+
+        async def probe(self, state, inst):
+            program = self.Taskmaster._spec(state)
+            spec = program.config["healthcheck"]
+            values = {"index": inst.index, "pid": inst.pid, "program": inst.program}
+            port = spec["port"]
+            if port is not None:
+                port = int(port) + int(spec["port_step"]) * (inst.index - 1)
+            timeout = float(spec["timeout"])
+            async with self.semaphore:
+                if spec["type"] == "http":
+                    return await probe_http(spec["host"], port, spec["path"].format(**values), timeout)
+                if spec["type"] == "exec":
+                    return await probe_exec(spec["command"].format(**values), timeout,
+                                            program.command_env, program.cwd)
+                return await probe_tcp(spec["host"], port, timeout)
+
+        async def _probe_loop(self, state, inst):
+            try:
+                while state.owns(inst) and inst.state in (InstanceStatus.STARTING, InstanceStatus.RUNNING):
+                    config = state.config
+                    if not config.get("healthcheck"):
+                        break
+                    ok, detail = await self.probe(state, inst)
+                    self.Taskmaster.timers.call_later(0, self.Taskmaster._locked_timer, state.name,
+                                                      self.Taskmaster._probe_result, state, inst, ok, detail)
+                    await asyncio.sleep(float(config["healthcheck"]["interval"]))
+            finally:
+                self.tasks.pop(inst, None)
+
+
+class ProgramStatus(str, Enum):
+        CREATED = "CREATED"
+        STARTED = "STARTED"
+        STOPPED = "STOPPED"
+        BACKOFF = "BACKOFF"
+
+        def __str__(self):
+            return self.value
+
+
+class InstanceStatus(str, Enum):
+        STARTING = "STARTING"
+        RUNNING = "RUNNING"
+        BACKOFF = "BACKOFF"
+        STOPPING = "STOPPING"
+        STOPPED = "STOPPED"
+        EXITED = "EXITED"
+        FATAL = "FATAL"
+
+        def __str__(self):
+            return self.value
+
+
+ALIVE_STATES = frozenset((InstanceStatus.STARTING, InstanceStatus.RUNNING, InstanceStatus.STOPPING))
+
+
+class InstanceState:
+
+        __slots__ = ("program", "index", "proc", "pid", "state", "start_time", "start_ticks", "retries",
+                     "restarts", "stdout_handle", "stderr_handle", "on_stopped", "health",
+                     "probe_successes", "probe_failures", "limit")
+
+        def __init__(self, program, index, proc, stdout_handle=None, stderr_handle=None):
+            self.program = program
+            self.index = index
+            self.proc = proc
+            self.pid = proc.pid
+            self.state = InstanceStatus.STARTING
+            self.start_time = time.time()
+            self.start_ticks = None
+            self.retries = 0
+            self.restarts = 0
+            self.stdout_handle = stdout_handle
+            self.stderr_handle = stderr_handle
+            self.on_stopped = None
+            self.health = None
+            self.probe_successes = 0
+            self.probe_failures = 0
+            self.limit = None
+
+
+class ProgramSpec:
+
+        __slots__ = ("config", "argv", "env", "command_env", "cwd", "umask", "stopsignal")
+
+        def __init__(self, config, argv, env, stopsignal, command_env=None):
+            self.config = config
+            self.argv = tuple(argv)
+            self.env = env
+            self.command_env = env if command_env is None else command_env
+            self.cwd = config.get("workingdir")
+            self.umask = -1 if config.get("umask") is None else config.get("umask")
+            self.stopsignal = stopsignal
+
+
+class ProgramState:
+
+        __slots__ = ("name", "config", "instances", "status", "running", "spawn_results",
+                     "exit_times", "crashloop", "spec")
+
+        def __init__(self, name, config):
+            self.name = name
+            self.config = config
+            self.instances = {}
+            self.status = ProgramStatus.CREATED
+            self.running = 0
+            self.spawn_results = {}
+            self.exit_times = deque()
+            self.crashloop = False
+            self.spec = None
+
+        def add(self, inst):
+            self.remove(self.instances.get(inst.index))
+            self.instances[inst.index] = inst
+            if inst.state in ALIVE_STATES:
+                self.running += 1
+
+        def remove(self, inst):
+            if inst is None or self.instances.get(inst.index) is not inst:
+                return
+            del self.instances[inst.index]
+            if inst.state in ALIVE_STATES:
+                self.running -= 1
+
+        def owns(self, inst):
+            return self.instances.get(inst.index) is inst
+
+        def transition(self, inst, state):
+            if self.owns(inst):
+                self.running += (state in ALIVE_STATES) - (inst.state in ALIVE_STATES)
+            inst.state = state
+
+        def clear(self):
+            self.instances = {}
+            self.running = 0
+
+        def refresh_status(self):
+            if self.running:
+                self.status = ProgramStatus.STARTED
+            elif any(inst.state == InstanceStatus.BACKOFF for inst in self.instances.values()):
+                self.status = ProgramStatus.BACKOFF
+            elif self.instances:
+                self.status = ProgramStatus.STOPPED
+            else:
+                self.status = ProgramStatus.CREATED
+            return self.status
+
+
+class TimerScheduler:
+
+        def __init__(self, wake=None):
+            self.heap = []
+            self.lock = threading.Lock()
+            self.counter = 0
+            self.wake = wake
+
+        def call_at(self, when, callback, *args):
+            with self.lock:
+                self.counter += 1
+                entry = [when, self.counter, callback, args]
+                heapq.heappush(self.heap, entry)
+                first = self.heap[0] is entry
+            if first and self.wake is not None:
+                self.wake()
+            return entry
+
+        def call_later(self, delay, callback, *args):
+            return self.call_at(time.monotonic() + max(0, delay), callback, *args)
+
+        def cancel(self, entry):
+            entry[2] = None
+
+        def next_timeout(self):
+            with self.lock:
+                while self.heap and self.heap[0][2] is None:
+                    heapq.heappop(self.heap)
+                if not self.heap:
+                    return None
+                return max(0, self.heap[0][0] - time.monotonic())
+
+        def run_due(self):
+            now = time.monotonic()
+            due = []
+            with self.lock:
+                while self.heap and self.heap[0][0] <= now:
+                    due.append(heapq.heappop(self.heap))
+            for _, _, callback, args in due:
+                if callback is not None:
+                    try:
+                        callback(*args)
+                    except Exception:
+                        pass
+            return len(due)
+
+
+class ChildReaper:
+
+        def __init__(self):
+            self.selector = selectors.DefaultSelector()
+            self.use_pidfd = hasattr(os, "pidfd_open")
+            self.watched = {}
+            self.wake_r, self.wake_w = os.pipe()
+            os.set_blocking(self.wake_r, False)
+            os.set_blocking(self.wake_w, False)
+            self.selector.register(self.wake_r, selectors.EVENT_READ, None)
+
+        def watch(self, proc, data):
+            pidfd = None
+            if self.use_pidfd:
+                try:
+                    pidfd = os.pidfd_open(proc.pid)
+                except OSError:
+                    self.use_pidfd = False
+            self.watched[proc.pid] = (proc, pidfd, data)
+            if pidfd is not None:
+                self.selector.register(pidfd, selectors.EVENT_READ, proc.pid)
+            else:
+                self.wake()
+
+        def unwatch(self, proc):
+            entry = self.watched.pop(proc.pid, None)
+            if entry is None or entry[1] is None:
+                return
+            try:
+                self.selector.unregister(entry[1])
+            except (KeyError, ValueError):
+                pass
+            os.close(entry[1])
+
+        def wake(self):
+            try:
+                os.write(self.wake_w, b"\0")
+            except (BlockingIOError, OSError):
+                pass
+
+        def on_sigchld(self, signum, frame):
+            self.wake()
+
+        def wait(self, timeout=None):
+            if not self.use_pidfd and (timeout is None or timeout > 1):
+                timeout = 1
+            exited = []
+            sweep = not self.use_pidfd
+            for key, _ in self.selector.select(timeout):
+                if key.data is None:
+                    try:
+                        while os.read(self.wake_r, 4096):
+                            pass
+                    except (BlockingIOError, OSError):
+                        pass
+                    continue
+                entry = self.watched.get(key.data)
+                if entry is not None:
+                    self.unwatch(entry[0])
+                    exited.append(entry[2])
+            if sweep:
+                for pid, (proc, pidfd, data) in list(self.watched.items()):
+                    if pidfd is None and proc.poll() is not None:
+                        self.watched.pop(pid, None)
+                        exited.append(data)
+            return exited
+
+
+def proc_start_ticks(pid):
+    try:
+        with open(f"/proc/{pid}/stat", "rb") as handle:
+            stat = handle.read()
+        return int(stat[stat.rindex(b")") + 2:].split()[19])
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class AdoptedProcess:
+
+        __slots__ = ("pid", "pidfd", "returncode", "args")
+
+        def __init__(self, pid, pidfd):
+            self.pid = pid
+            self.pidfd = pidfd
+            self.returncode = None
+            self.args = str(pid)
+
+        @classmethod
+        def attach(cls, pid, start_ticks):
+            try:
+                pidfd = os.pidfd_open(pid)
+            except OSError:
+                return None
+            if start_ticks is None or proc_start_ticks(pid) != start_ticks:
+                os.close(pidfd)
+                return None
+            return cls(pid, pidfd)
+
+        def _close(self):
+            if self.pidfd is not None:
+                os.close(self.pidfd)
+                self.pidfd = None
+
+        def poll(self):
+            if self.returncode is not None:
+                return self.returncode
+            try:
+                wpid, status = os.waitpid(self.pid, os.WNOHANG)
+            except ChildProcessError:
+                if select.select([self.pidfd], [], [], 0)[0]:
+                    self.returncode = UNKNOWN_EXITCODE
+                    self._close()
+                return self.returncode
+            if wpid:
+                self.returncode = os.waitstatus_to_exitcode(status)
+                self._close()
+            return self.returncode
+
+        def wait(self, timeout=None):
+            deadline = None if timeout is None else time.monotonic() + timeout
+            while self.poll() is None:
+                wait = 0.1
+                if deadline is not None:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise subprocess.TimeoutExpired(self.args, timeout)
+                    wait = min(wait, remaining)
+                select.select([self.pidfd], [], [], wait)
+            return self.returncode
+
+        def send_signal(self, sig):
+            if self.poll() is None:
+                try:
+                    signal.pidfd_send_signal(self.pidfd, sig)
+                except ProcessLookupError:
+                    pass
+
+        def terminate(self):
+            self.send_signal(signal.SIGTERM)
+
+        def kill(self):
+            self.send_signal(signal.SIGKILL)
+
+
+class StateJournal:
+
+        def __init__(self, path=None):
+            self.path = path
+            self.fd = None
+            self.records = {}
+            self.lines = 0
+            self.lock = threading.Lock()
+
+        def load(self):
+            records = {}
+            try:
+                with open(self.path) as handle:
+                    for line in handle:
+                        try:
+                            record = json.loads(line)
+                        except ValueError:
+                            continue
+                        if record.get("x"):
+                            records.pop(record["p"], None)
+                        else:
+                            records[record["p"]] = record
+            except (OSError, TypeError):
+                pass
+            return records
+
+        def open(self, records=None):
+            with self.lock:
+                self.records = dict(records or {})
+                self._compact()
+
+        def record(self, prog, record):
+            if self.fd is None:
+                return
+            with self.lock:
+                if record is None:
+                    if self.records.pop(prog, None) is None:
+                        return
+                    record = {"p": prog, "x": 1}
+                elif self.records.get(prog) == record:
+                    return
+                else:
+                    self.records[prog] = record
+                if self.fd is None:
+                    return
+                os.write(self.fd, json.dumps(record, separators=(",", ":")).encode() + b"\n")
+                self.lines += 1
+                if self.lines > max(64, 4 * len(self.records)):
+                    self._compact()
+
+        def _compact(self):
+            if self.fd is not None:
+                os.close(self.fd)
+                self.fd = None
+            tmp = f"{self.path}.tmp"
+            with open(tmp, "w") as handle:
+                for record in self.records.values():
+                    handle.write(json.dumps(record, separators=(",", ":")) + "\n")
+                handle.flush()
+                os.fsync(handle.fileno())
+            os.replace(tmp, self.path)
+            self.fd = os.open(self.path, os.O_WRONLY | os.O_APPEND)
+            self.lines = len(self.records)
+
+        def close(self):
+            with self.lock:
+                if self.fd is not None:
+                    os.fsync(self.fd)
+                    os.close(self.fd)
+                    self.fd = None
+
+
+def open_listener(spec, reuseport=False, backlog=SOCKET_BACKLOG):
+    if spec.startswith("unix://"):
+        path = spec[len("unix://"):]
+        if os.path.exists(path):
+            os.unlink(path)
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        address = path
+    else:
+        if spec.startswith("tcp://"):
+            spec = spec[len("tcp://"):]
+        host, _, port = spec.rpartition(":")
+        host = host.strip("[]") or None
+        family, kind, proto, _, address = socket.getaddrinfo(
+            host, int(port), type=socket.SOCK_STREAM, flags=socket.AI_PASSIVE)[0]
+        sock = socket.socket(family, kind, proto)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        if reuseport:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    try:
+        sock.bind(address)
+        sock.listen(backlog)
+    except OSError:
+        sock.close()
+        raise
+    return sock
+
+
+class SocketManager:
+
+        def __init__(self):
+            self.listeners = {}
+            self.lock = threading.Lock()
+
+        def fd(self, prog, index, config):
+            spec = str(config["socket"])
+            reuseport = bool(config.get("socket_reuseport"))
+            backlog = int(config.get("socket_backlog") or SOCKET_BACKLOG)
+            key = (prog, index if reuseport else None)
+            wanted = (spec, reuseport, backlog)
+            with self.lock:
+                entry = self.listeners.get(key)
+                if entry is None or entry[0] != wanted:
+                    if entry is not None:
+                        entry[1].close()
+                        del self.listeners[key]
+                    self.listeners[key] = (wanted, open_listener(spec, reuseport, backlog))
+                return self.listeners[key][1].fileno()
+
+        def trim(self, prog, numprocs):
+            with self.lock:
+                for key in [k for k in self.listeners if k[0] == prog and (k[1] or 0) > numprocs]:
+                    self.listeners.pop(key)[1].close()
+
+        def forget(self, prog):
+            self.trim(prog, -1)
+
+        def close(self):
+            with self.lock:
+                for _, sock in self.listeners.values():
+                    sock.close()
+                self.listeners = {}
+
+
+def raise_fd_limit():
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    target = hard
+    if target == resource.RLIM_INFINITY:
+        try:
+            with open("/proc/sys/fs/nr_open") as handle:
+                target = int(handle.read())
+        except (OSError, ValueError):
+            target = soft
+    if soft != resource.RLIM_INFINITY and target > soft:
+        try:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (target, hard))
+            soft = target
+        except (OSError, ValueError):
+            pass
+    return soft
+
+
+def rotate_file(path, backups):
+    if backups > 0:
+        for n in range(backups - 1, 0, -1):
+            src = f"{path}.{n}"
+            if os.path.exists(src):
+                os.replace(src, f"{path}.{n + 1}")
+        os.replace(path, f"{path}.1")
+    else:
+        open(path, "w").close()
+
+
+class LogWriter:
+
+        def __init__(self, path, max_bytes=LOG_MAX_BYTES, backups=LOG_BACKUPS,
+                     queue_size=10000, batch_size=256, flush_interval=0.2):
+            self.path = path
+            self.max_bytes = max_bytes
+            self.backups = backups
+            self.batch_size = batch_size
+            self.flush_interval = flush_interval
+            self.queue = queue.Queue(maxsize=queue_size)
+            self.dropped = 0
+            self.file = None
+            self.thread = None
+            self.start_lock = threading.Lock()
+
+        def configure(self, max_bytes=None, backups=None):
+            if max_bytes is not None:
+                self.max_bytes = int(max_bytes)
+            if backups is not None:
+                self.backups = int(backups)
+
+        def start(self):
+            with self.start_lock:
+                if self.thread is None:
+                    self.thread = threading.Thread(target=self._run, daemon=True)
+                    self.thread.start()
+
+        def write(self, line):
+            if self.thread is None:
+                self.start()
+            try:
+                self.queue.put_nowait(line)
+            except queue.Full:
+                self.dropped += 1
+
+        def flush(self, timeout=5):
+            if self.thread is None or not self.thread.is_alive():
+                return
+            done = threading.Event()
+            try:
+                self.queue.put(done, timeout=timeout)
+            except queue.Full:
+                return
+            done.wait(timeout)
+
+        def close(self, timeout=5):
+            self.flush(timeout)
+            if self.thread is not None and self.thread.is_alive():
+                try:
+                    self.queue.put(None, timeout=timeout)
+                except queue.Full:
+                    pass
+                self.thread.join(timeout)
+            self.thread = None
+
+        def _open(self):
+            if self.file is None:
+                self.file = open(self.path, "a")
+            return self.file
+
+        def _rotate(self):
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+            rotate_file(self.path, self.backups)
+
+        def _write_batch(self, lines):
+            if not lines:
+                return
+            data = "".join(f"{line}\n" for line in lines)
+            try:
+                handle = self._open()
+                if self.max_bytes and handle.tell() and handle.tell() + len(data) > self.max_bytes:
+                    self._rotate()
+                    handle = self._open()
+                handle.write(data)
+                handle.flush()
+            except OSError:
+                self.dropped += len(lines)
+
+        def _run(self):
+            while True:
+                item = self.queue.get()
+                batch = []
+                waiters = []
+                running = True
+                deadline = time.monotonic() + self.flush_interval
+                while True:
+                    if item is None:
+                        running = False
+                        break
+                    if isinstance(item, threading.Event):
+                        waiters.append(item)
+                        break
+                    batch.append(item)
+                    if len(batch) >= self.batch_size:
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    try:
+                        item = self.queue.get(timeout=remaining)
+                    except queue.Empty:
+                        break
+                self._write_batch(batch)
+                for waiter in waiters:
+                    waiter.set()
+                if not running:
+                    if self.file is not None:
+                        self.file.close()
+                        self.file = None
+                    return
+
+
+class EventJournal(LogWriter):
+
+        def __init__(self, directory=None, max_bytes=EVENTS_SEGMENT_BYTES, retention_days=EVENTS_RETENTION_DAYS,
+                     bucket=EVENTS_BUCKET):
+            super().__init__(None, max_bytes=max_bytes, backups=0)
+            self.directory = directory
+            self.retention_days = retention_days
+            self.bucket = bucket
+            self.segments = []
+            self.index_lock = threading.Lock()
+            self.index_saved = 0.0
+
+        def _segment_path(self, seq, suffix="jsonl"):
+            return os.path.join(self.directory, f"events-{seq:06d}.{suffix}")
+
+        def _new_segment(self, seq):
+            return {"seq": seq, "first": None, "last": None, "size": 0, "index": {}}
+
+        def open(self, directory=None):
+            if directory is not None:
+                self.directory = directory
+            if not self.directory:
+                return
+            os.makedirs(self.directory, exist_ok=True)
+            segments = []
+            for name in sorted(os.listdir(self.directory)):
+                if name.startswith("events-") and name.endswith(".jsonl"):
+                    segments.append(self._load_segment(int(name[7:-6])))
+            with self.index_lock:
+                self.segments = self.compact(segments)
+                seq = self.segments[-1]["seq"] + 1 if self.segments else 1
+                self.segments.append(self._new_segment(seq))
+                self.path = self._segment_path(seq)
+            self.start()
+
+        def _load_segment(self, seq):
+            path = self._segment_path(seq)
+            try:
+                with open(self._segment_path(seq, "idx")) as handle:
+                    segment = json.load(handle)
+                if segment.get("size") == os.path.getsize(path):
+                    return segment
+            except (OSError, ValueError):
+                pass
+            return self._rebuild_segment(seq, path)
+
+        def _rebuild_segment(self, seq, path):
+            segment = self._new_segment(seq)
+            offset = 0
+            with open(path, "rb") as handle:
+                for line in handle:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        break
+                    self._index(segment, record, offset, offset + len(line))
+                    offset += len(line)
+            if offset != os.path.getsize(path):
+                with open(path, "r+b") as handle:
+                    handle.truncate(offset)
+            segment["size"] = offset
+            self._save_index(segment)
+            return segment
+
+        def _index(self, segment, record, start, end):
+            t = record["t"]
+            if segment["first"] is None:
+                segment["first"] = t
+            segment["last"] = t
+            segment["size"] = end
+            buckets = segment["index"].setdefault(record.get("p") or "", {})
+            key = str(int(t // self.bucket) * self.bucket)
+            entry = buckets.get(key)
+            if entry is None:
+                buckets[key] = [start, end, 1]
+            else:
+                entry[1] = end
+                entry[2] += 1
+
+        def _save_index(self, segment):
+            path = self._segment_path(segment["seq"], "idx")
+            with open(f"{path}.tmp", "w") as handle:
+                json.dump(segment, handle, separators=(",", ":"))
+            os.replace(f"{path}.tmp", path)
+
+        def compact(self, segments):
+            horizon = time.time() - self.retention_days * 86400
+            kept = []
+            for segment in segments:
+                if self.retention_days and segment["last"] is not None and segment["last"] < horizon:
+                    self._remove_segment(segment["seq"])
+                elif segment["size"] == 0:
+                    self._remove_segment(segment["seq"])
+                else:
+                    kept.append(segment)
+            merged = []
+            for segment in kept:
+                target = merged[-1] if merged else None
+                if (target is not None and self.max_bytes
+                        and target["size"] + segment["size"] <= self.max_bytes // 2):
+                    merged[-1] = self._merge(target, segment)
+                else:
+                    merged.append(segment)
+            return merged
+
+        def _merge(self, target, segment):
+            path = self._segment_path(target["seq"])
+            with open(self._segment_path(segment["seq"]), "rb") as src, open(path, "ab") as dst:
+                offset = target["size"]
+                for line in src:
+                    self._index(target, json.loads(line), offset, offset + len(line))
+                    offset += len(line)
+                    dst.write(line)
+            self._save_index(target)
+            self._remove_segment(segment["seq"])
+            return target
+
+        def _remove_segment(self, seq):
+            for suffix in ("jsonl", "idx"):
+                try:
+                    os.unlink(self._segment_path(seq, suffix))
+                except OSError:
+                    pass
+
+        def write(self, record):
+            if self.path is not None:
+                super().write(record)
+
+        def _open(self):
+            if self.file is None:
+                self.file = open(self.path, "ab")
+            return self.file
+
+        def _rotate(self):
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+            with self.index_lock:
+                self._save_index(self.segments[-1])
+                segment = self._new_segment(self.segments[-1]["seq"] + 1)
+                self.segments = self.compact(self.segments) + [segment]
+                self.path = self._segment_path(segment["seq"])
+
+        def _write_batch(self, records):
+            if not records:
+                return
+            lines = [json.dumps(r, separators=(",", ":")).encode() + b"\n" for r in records]
+            try:
+                segment = self.segments[-1]
+                if self.max_bytes and segment["size"] and segment["size"] + sum(map(len, lines)) > self.max_bytes:
+                    self._rotate()
+                    segment = self.segments[-1]
+                handle = self._open()
+                handle.write(b"".join(lines))
+                handle.flush()
+            except OSError:
+                self.dropped += len(records)
+                return
+            with self.index_lock:
+                offset = segment["size"]
+                for record, line in zip(records, lines):
+                    self._index(segment, record, offset, offset + len(line))
+                    offset += len(line)
+                if time.monotonic() - self.index_saved > 5:
+                    self._save_index(segment)
+                    self.index_saved = time.monotonic()
+
+        def close(self, timeout=5):
+            super().close(timeout)
+            with self.index_lock:
+                if self.segments and self.segments[-1]["size"]:
+                    self._save_index(self.segments[-1])
+
+        def query(self, prog, since=None, until=None, index=None, limit=None):
+            self.flush()
+            since = since or 0
+            until = until if until is not None else float("inf")
+            first_bucket = int(since // self.bucket) * self.bucket
+            with self.index_lock:
+                plan = []
+                for segment in self.segments:
+                    if segment["last"] is None or segment["last"] < since or segment["first"] > until:
+                        continue
+                    ranges = [r for b, r in segment["index"].get(prog, {}).items()
+                              if first_bucket <= int(b) <= until]
+                    if ranges:
+                        plan.append((segment["seq"], min(r[0] for r in ranges), max(r[1] for r in ranges)))
+                chunks = []
+                for seq, start, end in plan:
+                    try:
+                        with open(self._segment_path(seq), "rb") as handle:
+                            handle.seek(start)
+                            chunks.append(handle.read(end - start))
+                    except OSError:
+                        continue
+            events = []
+            for data in chunks:
+                for line in data.splitlines():
+                    record = json.loads(line)
+                    if record.get("p") != prog or not since <= record["t"] <= until:
+                        continue
+                    if index is not None and record.get("i") != index:
+                        continue
+                    events.append(record)
+            if limit:
+                events = events[-limit:]
+            return events
+
+
+class HttpSender:
+
+        def __init__(self, url, timeout=ALERT_TIMEOUT, headers=None):
+            parts = urllib.parse.urlsplit(url)
+            if parts.scheme not in ("http", "https") or not parts.hostname:
+                raise ValueError(f"unsupported alert URL '{url}'")
+            self.url = url
+            self.connection_class = (http.client.HTTPSConnection if parts.scheme == "https"
+                                     else http.client.HTTPConnection)
+            self.netloc = parts.netloc
+            self.path = parts.path or "/"
+            if parts.query:
+                self.path = f"{self.path}?{parts.query}"
+            self.timeout = timeout
+            self.headers = {"Content-Type": "application/json"}
+            self.headers.update(headers or {})
+            self.connection = None
+
+        def __call__(self, batch):
+            body = json.dumps(batch).encode()
+            for attempt in range(2):
+                reused = self.connection is not None
+                if self.connection is None:
+                    self.connection = self.connection_class(self.netloc, timeout=self.timeout)
+                try:
+                    self.connection.request("POST", self.path, body, self.headers)
+                    response = self.connection.getresponse()
+                    response.read()
+                except (http.client.HTTPException, OSError):
+                    self.close()
+                    if reused and attempt == 0:
+                        continue
+                    raise
+                if response.will_close:
+                    self.close()
+                if response.status >= 300:
+                    raise OSError(f"HTTP {response.status} {response.reason}")
+                return
+
+        def close(self):
+            if self.connection is not None:
+                self.connection.close()
+                self.connection = None
+
+
+class SmtpSender:
+
+        def __init__(self, host="localhost", port=25, sender=None, to=None, timeout=ALERT_TIMEOUT,
+                     starttls=False, username=None, password=None, subject="[taskmaster] {summary}"):
+            if not to:
+                raise ValueError("smtp alerts need at least one 'to' address")
+            self.host = host
+            self.port = int(port)
+            self.sender = sender or f"taskmaster@{socket.gethostname()}"
+            self.to = [to] if isinstance(to, str) else list(to)
+            self.timeout = timeout
+            self.starttls = starttls
+            self.username = username
+            self.password = password
+            self.subject = subject
+
+        def message(self, batch):
+            message = EmailMessage()
+            message["From"] = self.sender
+            message["To"] = ", ".join(self.to)
+            message["Subject"] = self.subject.format(summary=batch["summary"], host=batch["host"])
+            lines = [f"{batch['total']} event(s) on {batch['host']} between "
+                     f"{datetime.fromtimestamp(batch['first']):%Y-%m-%d %H:%M:%S} and "
+                     f"{datetime.fromtimestamp(batch['last']):%Y-%m-%d %H:%M:%S}", ""]
+            for prog, entry in batch["programs"].items():
+                counts = ", ".join(f"{name} x{count}" for name, count in entry["counts"].items())
+                lines.append(f"{prog}: {counts}")
+                for event in entry["events"]:
+                    stamp = datetime.fromtimestamp(event["t"]).strftime("%H:%M:%S")
+                    name = f"{prog}:{event['i']}" if "i" in event else prog
+                    pid = f" [PID:{event['pid']}]" if "pid" in event else ""
+                    data = f" {format_event_data(event['d'])}" if event.get("d") else ""
+                    lines.append(f"  [{stamp}] [{name}]{pid} {event['e']}{data}")
+                if entry["dropped"]:
+                    lines.append(f"  ... {entry['dropped']} more")
+                lines.append("")
+            message.set_content("\n".join(lines))
+            return message
+
+        def __call__(self, batch):
+            with smtplib.SMTP(self.host, self.port, timeout=self.timeout) as client:
+                if self.starttls:
+                    client.starttls()
+                if self.username:
+                    client.login(self.username, self.password or "")
+                client.send_message(self.message(batch), from_addr=self.sender, to_addrs=self.to)
+
+        def close(self):
+            pass
+
+
+class AlertChannel:
+
+        def __init__(self, name, sender, retries=ALERT_RETRIES, backoff=ALERT_BACKOFF,
+                     limit=ALERT_QUEUE_LIMIT, on_error=None):
+            self.name = name
+            self.sender = sender
+            self.retries = retries
+            self.backoff = backoff
+            self.limit = limit
+            self.on_error = on_error
+            self.pending = deque()
+            self.cond = threading.Condition()
+            self.running = True
+            self.thread = None
+            self.delivered = 0
+            self.failed = 0
+            self.dropped = 0
+
+        def submit(self, batch):
+            with self.cond:
+                if len(self.pending) >= self.limit:
+                    self.pending.popleft()
+                    self.dropped += 1
+                self.pending.append([0, 0, batch])
+                if self.thread is None:
+                    self.thread = threading.Thread(target=self._run, daemon=True)
+                    self.thread.start()
+                self.cond.notify()
+
+        def _next(self):
+            with self.cond:
+                while True:
+                    if not self.pending:
+                        if not self.running:
+                            return None
+                        self.cond.wait()
+                        continue
+                    delay = self.pending[0][0] - time.monotonic()
+                    if delay <= 0 or not self.running:
+                        return self.pending.popleft()
+                    self.cond.wait(delay)
+
+        def _run(self):
+            while True:
+                entry = self._next()
+                if entry is None:
+                    self.sender.close()
+                    return
+                try:
+                    self.sender(entry[2])
+                    self.delivered += 1
+                    continue
+                except Exception as e:
+                    error = e
+                entry[1] += 1
+                with self.cond:
+                    if entry[1] <= self.retries and self.running:
+                        entry[0] = time.monotonic() + self.backoff * 2 ** (entry[1] - 1)
+                        self.pending.appendleft(entry)
+                        continue
+                    self.failed += 1
+                if self.on_error is not None:
+                    self.on_error(self.name, error)
+
+        def close(self, timeout=5):
+            with self.cond:
+                self.running = False
+                self.cond.notify()
+            if self.thread is not None:
+                self.thread.join(timeout)
+            self.thread = None
+
+
+class AlertDispatcher:
+
+        def __init__(self, on_error=None):
+            self.on_error = on_error
+            self.config = None
+            self.channels = []
+            self.events = frozenset(ALERT_EVENTS)
+            self.programs = None
+            self.window = ALERT_WINDOW
+            self.max_events = ALERT_MAX_EVENTS
+            self.groups = {}
+            self.window_start = None
+            self.lock = threading.Lock()
+            self.wake = threading.Condition(self.lock)
+            self.running = True
+            self.thread = None
+
+        def configure(self, config):
+            if config == self.config:
+                return
+            self.flush()
+            for channel in self.channels:
+                channel.close()
+            self.config = config
+            self.channels = []
+            if not config:
+                return
+            self.events = frozenset(config.get("events") or ALERT_EVENTS)
+            self.programs = frozenset(config["programs"]) if config.get("programs") else None
+            self.window = float(config.get("window", ALERT_WINDOW))
+            self.max_events = int(config.get("max_events", ALERT_MAX_EVENTS))
+            retry = {
+                "retries": int(config.get("retries", ALERT_RETRIES)),
+                "backoff": float(config.get("retry_backoff", ALERT_BACKOFF)),
+                "limit": int(config.get("queue_limit", ALERT_QUEUE_LIMIT)),
+                "on_error": self.on_error,
+            }
+            http_config = config.get("http")
+            if http_config:
+                if isinstance(http_config, str):
+                    http_config = {"url": http_config}
+                sender = HttpSender(http_config["url"], float(http_config.get("timeout", ALERT_TIMEOUT)),
+                                    http_config.get("headers"))
+                self.channels.append(AlertChannel("http", sender, **retry))
+            smtp_config = config.get("smtp")
+            if smtp_config:
+                options = {key: smtp_config[key] for key in ("host", "port", "to", "starttls", "username",
+                                                              "password", "subject") if key in smtp_config}
+                sender = SmtpSender(sender=smtp_config.get("from"),
+                                    timeout=float(smtp_config.get("timeout", ALERT_TIMEOUT)), **options)
+                self.channels.append(AlertChannel("smtp", sender, **retry))
+
+        def notify(self, event):
+            if not self.channels or event["e"].split(" (", 1)[0] not in self.events:
+                return
+            prog = event.get("p", "taskmaster")
+            if self.programs is not None and prog not in self.programs:
+                return
+            with self.lock:
+                group = self.groups.get(prog)
+                if group is None:
+                    group = self.groups[prog] = {"counts": {}, "events": deque(maxlen=self.max_events),
+                                                 "first": event["t"], "total": 0}
+                group["counts"][event["e"]] = group["counts"].get(event["e"], 0) + 1
+                group["events"].append(event)
+                group["total"] += 1
+                group["last"] = event["t"]
+                if self.window_start is None:
+                    self.window_start = time.monotonic()
+                    if self.thread is None:
+                        self.thread = threading.Thread(target=self._run, daemon=True)
+                        self.thread.start()
+                    self.wake.notify()
+
+        def _batch(self, groups):
+            programs = {}
+            for prog, group in sorted(groups.items()):
+                programs[prog] = {
+                    "counts": group["counts"],
+                    "events": list(group["events"]),
+                    "dropped": group["total"] - len(group["events"]),
+                    "first": group["first"],
+                    "last": group["last"],
+                }
+            summary = "; ".join(
+                f"{prog}: " + ", ".join(f"{name} x{count}" if count > 1 else name
+                                         for name, count in entry["counts"].items())
+                for prog, entry in list(programs.items())[:3])
+            if len(programs) > 3:
+                summary += f" (+{len(programs) - 3} more)"
+            return {
+                "host": socket.gethostname(),
+                "first": min(entry["first"] for entry in programs.values()),
+                "last": max(entry["last"] for entry in programs.values()),
+                "total": sum(group["total"] for group in groups.values()),
+                "summary": summary,
+                "programs": programs,
+            }
+
+        def flush(self):
+            with self.lock:
+                groups = self.groups
+                self.groups = {}
+                self.window_start = None
+            if not groups:
+                return None
+            batch = self._batch(groups)
+            for channel in self.channels:
+                channel.submit(batch)
+            return batch
+
+        def _run(self):
+            while True:
+                with self.lock:
+                    while self.running and self.window_start is None:
+                        self.wake.wait()
+                    if not self.running:
+                        return
+                    remaining = self.window_start + self.window - time.monotonic()
+                    if remaining > 0:
+                        self.wake.wait(remaining)
+                        continue
+                self.flush()
+
+        def stats(self):
+            return {channel.name: {"delivered": channel.delivered, "failed": channel.failed,
+                                   "dropped": channel.dropped, "queued": len(channel.pending)}
+                    for channel in self.channels}
+
+        def close(self, timeout=5):
+            with self.lock:
+                self.running = False
+                self.wake.notify()
+            self.flush()
+            for channel in self.channels:
+                channel.close(timeout)
+
+
+class ControlServer:
+
+        def __init__(self, taskmaster, path):
+            self.Taskmaster = taskmaster
+            self.path = path
+            self.loop = None
+            self.stop_event = None
+            self.thread = None
+            self.started = threading.Event()
+            self.clients = {}
+            self.handlers = {
+                "ping": self.handle_ping,
+                "status": self.handle_status,
+                "start": self.handle_start,
+                "stop": self.handle_stop,
+                "restart": self.handle_restart,
+                "reload": self.handle_reload,
+                "shutdown": self.handle_shutdown,
+                "tail": self.handle_tail,
+                "metrics": self.handle_metrics,
+                "events": self.handle_events,
+                "attach": self.handle_attach,
+            }
+            self.blocking = {"start", "stop", "restart", "reload", "events"}
+
+        def start(self):
+            self._claim_path()
+            self.thread = threading.Thread(target=lambda: asyncio.run(self._serve()), daemon=True)
+            self.thread.start()
+            self.started.wait(5)
+
+        def stop(self):
+            if self.loop is not None and self.stop_event is not None:
+                self.loop.call_soon_threadsafe(self.stop_event.set)
+            if self.thread is not None and self.thread is not threading.current_thread():
+                self.thread.join(5)
+
+        def _claim_path(self):
+            try:
+                mode = os.lstat(self.path).st_mode
+            except FileNotFoundError:
+                return
+            if not stat.S_ISSOCK(mode):
+                raise OSError(f"{self.path} exists and is not a socket")
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                probe.connect(self.path)
+            except ConnectionRefusedError:
+                os.unlink(self.path)
+                return
+            except FileNotFoundError:
+                return
+            finally:
+                probe.close()
+            raise OSError(f"{self.path}: another taskmaster is already listening")
+
+        async def _serve(self):
+            self.loop = asyncio.get_running_loop()
+            self.stop_event = asyncio.Event()
+            server = await asyncio.start_unix_server(self._handle_client, path=self.path, limit=16 * 1024 * 1024)
+            os.chmod(self.path, 0o600)
+            self.started.set()
+            async with server:
+                await self.stop_event.wait()
+                for writer in list(self.clients.values()):
+                    writer.close()
+                if self.clients:
+                    await asyncio.wait(list(self.clients.keys()), timeout=5)
+            try:
+                os.unlink(self.path)
+            except OSError:
+                pass
+
+        async def _handle_client(self, reader, writer):
+            task = asyncio.current_task()
+            self.clients[task] = writer
+            try:
+                while True:
+                    line = await reader.readline()
+                    if not line:
+                        break
+                    request = None
+                    try:
+                        request = json.loads(line)
+                    except ValueError:
+                        response = {"ok": False, "error": "invalid JSON"}
+                    else:
+                        response = await self._dispatch(request)
+                    writer.write(json.dumps(response).encode() + b"\n")
+                    await writer.drain()
+                    if isinstance(request, dict) and request.get("cmd") == "attach" and response.get("ok"):
+                        self._hand_off(writer, request, response["result"])
+                        break
+            except (ConnectionError, asyncio.IncompleteReadError):
+                pass
+            finally:
+                self.clients.pop(task, None)
+                writer.close()
+
+        def _hand_off(self, writer, request, target):
+            sock = writer.get_extra_info("socket").dup()
+            self.Taskmaster.console.attach(target["program"], target["index"], sock,
+                                           request.get("rows"), request.get("cols"))
+
+        async def _dispatch(self, request):
+            if not isinstance(request, dict):
+                return {"ok": False, "error": "request must be a JSON object"}
+            if "batch" in request:
+                results = []
+                for entry in request.get("batch") or []:
+                    results.append(await self._execute(entry))
+                response = {"ok": all(r["ok"] for r in results), "results": results}
+            else:
+                response = await self._execute(request)
+            if "id" in request:
+                response["id"] = request["id"]
+            return response
+
+        async def _execute(self, request):
+            if not isinstance(request, dict):
+                return {"ok": False, "error": "request must be a JSON object"}
+            cmd = request.get("cmd")
+            handler = self.handlers.get(cmd)
+            if handler is None:
+                return {"ok": False, "error": f"unknown command '{cmd}'"}
+            try:
+                if cmd in self.blocking:
+                    result = await self.loop.run_in_executor(None, handler, request)
+                else:
+                    result = handler(request)
+            except Exception as e:
+                return {"ok": False, "error": str(e)}
+            return {"ok": True, "result": result}
+
+        def _targets(self, request):
+            progs = request.get("programs")
+            if progs is None and request.get("program") is not None:
+                progs = [request["program"]]
+            if isinstance(progs, str):
+                progs = [progs]
+            if not progs:
+                raise ValueError(f"no program specified for '{request.get('cmd')}'")
+            if "all" in progs:
+                return list(self.Taskmaster.programs.keys()), []
+            known = [p for p in progs if p in self.Taskmaster.programs]
+            unknown = [p for p in progs if p not in self.Taskmaster.programs]
+            return known, unknown
+
+        def _per_program(self, known, unknown, results=None, done="ok"):
+            out = {prog: {"ok": False, "error": "not found"} for prog in unknown}
+            for prog in known:
+                out[prog] = {"ok": True, "result": done}
+            for r in results or []:
+                entry = out[r["program"]]
+                entry.setdefault("instances", []).append(r)
+                if r["error"]:
+                    entry["ok"] = False
+                    entry["result"] = "failed"
+            return out
+
+        def handle_ping(self, request):
+            result = {"pid": os.getpid(), "ready": self.Taskmaster.ready.is_set()}
+            if self.Taskmaster.alerts.channels:
+                result["alerts"] = self.Taskmaster.alerts.stats()
+            return result
+
+        def handle_status(self, request):
+            progs = request.get("programs")
+            if isinstance(progs, str):
+                progs = [progs]
+            return self.Taskmaster.status_data(progs, metrics=bool(request.get("metrics")))
+
+        def handle_events(self, request):
+            prog = request.get("program")
+            if not prog:
+                raise ValueError("no program specified")
+            since = request.get("since")
+            if since is not None:
+                since = parse_since(since)
+            return self.Taskmaster.events_data(prog, since, request.get("index"), request.get("limit"))
+
+        def handle_metrics(self, request):
+            progs = request.get("programs")
+            if isinstance(progs, str):
+                progs = [progs]
+            return self.Taskmaster.metrics_data(progs)
+
+        def handle_start(self, request):
+            known, unknown = self._targets(request)
+            results = self.Taskmaster.start_programs(known)
+            return self._per_program(known, unknown, results, "started")
+
+        def handle_stop(self, request):
+            known, unknown = self._targets(request)
+            self.Taskmaster.stop_programs(known)
+            return self._per_program(known, unknown, done="stopped")
+
+        def handle_restart(self, request):
+            known, unknown = self._targets(request)
+            batch = request.get("batch_size")
+            if batch is not None and not is_count(batch):
+                raise ValueError(f"invalid batch '{batch}' (expected N or N%)")
+            results = self.Taskmaster.restart_programs(known, rolling=request.get("rolling"), batch=batch)
+            return self._per_program(known, unknown, results, "restarted")
+
+        def handle_tail(self, request):
+            prog = request.get("program")
+            if prog not in self.Taskmaster.programs:
+                raise ValueError(f"program '{prog}' not found")
+            return self.Taskmaster.tail(prog, request.get("index"), request.get("stream", "stdout"),
+                                        request.get("lines", 20))
+
+        def handle_attach(self, request):
+            return self.Taskmaster.console_target(request.get("program"), request.get("index"))
+
+        def handle_reload(self, request):
+            try:
+                changed = self.Taskmaster.reload_config()
+            except Exception as e:
+                self.Taskmaster.log_info(f"Configuration reload failed ({e})")
+                raise ValueError(f"configuration not reloaded: {e}") from e
+            return {"changed": changed, "programs": self.Taskmaster.reload_summary}
+
+        def handle_shutdown(self, request):
+            self.Taskmaster.request_shutdown(None, None)
+            return {"shutting_down": True}
+
+
+def parse_since(value):
+    text = str(value).strip()
+    units = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+    if text[-1:] in units and text[:-1].replace(".", "", 1).isdigit():
+        return time.time() - float(text[:-1]) * units[text[-1]]
+    try:
+        return float(text)
+    except ValueError:
+        return datetime.fromisoformat(text).timestamp()
+
+
+def print_events(result):
+    for event in result["events"]:
+        stamp = datetime.fromtimestamp(event["t"]).strftime("%Y-%m-%d %H:%M:%S")
+        name = f"{event['p']}:{event['i']}" if "i" in event else event["p"]
+        pid = f" [PID:{event['pid']}]" if "pid" in event else ""
+        data = f" {format_event_data(event['d'])}" if event.get("d") else ""
+        print(f"  [{stamp}] [{name}]{pid} {event['e']}{data}")
+    summary = ", ".join(f"{name} {count}" for name, count in sorted(result["by_event"].items()))
+    print(f"  {result['count']} event(s){': ' + summary if summary else ''}")
+
+
+def format_event_data(data):
+    return " ".join(f"{key}={value}" for key, value in data.items())
+
+
+def is_count(value):
+    text = str(value).strip()
+    return (text[:-1] if text.endswith("%") else text).isdigit()
+
+
+def format_bytes(value):
+    for unit in ("B", "K", "M", "G"):
+        if value < 1024 or unit == "G":
+            return f"{value:.0f}{unit}" if unit == "B" else f"{value:.1f}{unit}"
+        value /= 1024
+
+
+def print_instance_metrics(prog, instances):
+    for inst in instances:
+        sample = inst.get("metrics")
+        name = f"{prog}:{inst['index']}"
+        health = f" ({inst['health']})" if inst.get("health") else ""
+        if sample is None:
+            print(f"    {name:<13} {inst['state']:<10}{health}")
+            continue
+        print(f"    {name:<13} {inst['state']:<10} cpu {sample['cpu']:>6.1f}%  "
+              f"rss {format_bytes(sample['rss']):>7}  fds {sample['fds']:>4}  "
+              f"threads {sample['threads']:>3}  up {sample['uptime']:.0f}s{health}")
+
+
 class ControlShell:
     
         def __init__(self, Taskmaster):
@@ -26,32 +2222,38 @@ class ControlShell:
         def cmd_help(self):
             print("\nAvailable commands:")
             print("  help               - Show this help")
-            print("  status             - Show program status")
+            print("  status [-v]        - Show program status (-v: per-instance CPU/RSS/fds/threads)")
             print("  quit               - Exit taskmaster")
             print("  start [program]    - Start a program")
             print("  stop [program]     - Stop a program")
             print("  restart [program]  - Restart a program")
+            print("  rolling-restart [program] [batch]")
+            print("                     - Restart instances batch by batch (batch: count or %)")
             print("  reload             - Reload configuration file")
+            print("  tail [program][:n] [stdout|stderr] [lines]")
+            print("                     - Show recent output of a program or instance")
+            print("  metrics [program]  - Dump sampled resource metrics as JSON")
+            print("  events <program>[:n] [--since 1h|30m|<ISO time>] [--limit N]")
+            print("                     - Show recorded events of a program or instance")
+            print("  attach <program>[:n]")
+            print("                     - Attach to a 'console: pty' instance (Ctrl-] detaches)")
             print()
 
-        def cmd_status(self):
-            
-            
-            
+        def cmd_status(self, verbose=False):
+            programs = self.Taskmaster.status_data(metrics=verbose)
+
             print()
             print(f"{'─'*60}")
             print(f"  {'PROGRAM':<15} {'PID':<10} {'STATUS':<12} {'CMD'}")
             print(f"{'─'*60}")
             
-            for prog in list(self.Taskmaster.programs.keys()):
-                items = self.Taskmaster.programs[prog]
-                status = items.get("status")
-
-                cmd = items.get("cmd", "N/A")
-                procs = items.get("procs", [])
-                running_procs = [p for p in procs if p.get("proc") and p["proc"].poll() is None]
-                pid_list = ",".join(str(p["proc"].pid) for p in running_procs) if running_procs else "-"
-                total_expected = items.get("numprocs", 1)
+            for items in programs:
+                prog = items["name"]
+                status = items["status"]
+                cmd = items["cmd"] or "N/A"
+                running_procs = [p for p in items["instances"] if p["alive"]]
+                pid_list = ",".join(str(p["pid"]) for p in running_procs) if running_procs else "-"
+                total_expected = items["numprocs"]
 
                 if status == "CREATED":
                     status_icon = f"{RED}▪ STOPPED{RESET}"
@@ -64,14 +2266,27 @@ class ControlShell:
                     elif status == "STOPPED":
                         status_icon = f"{RED}▪ STOPPED{RESET}"
                         print(f"  {prog:<15} {pid_list:<10} {status_icon:<21} {cmd}")
+                    elif status == "BACKOFF":
+                        status_icon = f"{YELLOW}↻ BACKOFF{RESET}"
+                        print(f"  {prog:<15} {pid_list:<10} {status_icon:<21} {cmd} ({len(running_procs)}/{total_expected})")
+                if items.get("crashloop"):
+                    print(f"  {'':<15} {YELLOW}↻ crash loop: restarts delayed by backoff_max{RESET}")
+                if verbose:
+                    print_instance_metrics(prog, items["instances"])
             
             print(f"{'─'*60}")
-            print(f"  Total: {len(self.Taskmaster.programs)} program(s)")
+            print(f"  Total: {len(programs)} program(s)")
             print()
                 
         def cmd_start(self, target):
-            self.Taskmaster.start_program(target)
-            print(f"{GREEN}Program '{target}' started successfully.{RESET}")
+            results = self.Taskmaster.start_program(target)
+            failed = [r for r in results if r["error"]]
+            if failed:
+                print(f"{RED}Program '{target}': {len(failed)}/{len(results)} instance(s) failed to start.{RESET}")
+                for r in failed:
+                    print(f"{RED}  {target}:{r['index']} - {r['error']}{RESET}")
+            else:
+                print(f"{GREEN}Program '{target}' started successfully.{RESET}")
             
         def cmd_stop(self, target):
             self.Taskmaster.stop_program(target)
@@ -81,10 +2296,89 @@ class ControlShell:
             self.Taskmaster.restart_program(target)
             print(f"{GREEN}Program '{target}' restarted successfully.{RESET}")
         
+        def cmd_rolling_restart(self, target):
+            words = target.split()
+            prog = words[0]
+            batch = words[1] if len(words) > 1 else None
+            if batch is not None and not is_count(batch):
+                print(f"{RED}Error: invalid batch '{batch}'.{RESET}")
+                print("Usage: rolling-restart <program> [batch]  (batch: N instances or N%)")
+                return
+            results = self.Taskmaster.rolling_restart_program(prog, batch)
+            failed = [r for r in results if r["error"]]
+            if failed:
+                print(f"{RED}Rolling restart of '{prog}' stopped: {len(failed)} instance(s) not replaced.{RESET}")
+                for r in failed:
+                    print(f"{RED}  {prog}:{r['index']} - {r['error']}{RESET}")
+            else:
+                print(f"{GREEN}Program '{prog}' restarted successfully (rolling).{RESET}")
+
+        def cmd_tail(self, target):
+            words = target.split()
+            prog, _, index = words[0].partition(":")
+            stream = "stdout"
+            lines = 20
+            for word in words[1:]:
+                if word in ("stdout", "stderr"):
+                    stream = word
+                elif word.isdigit():
+                    lines = int(word)
+            if index and not index.isdigit():
+                print(f"{RED}Error: Invalid instance '{words[0]}'.{RESET}")
+                return
+            output = self.Taskmaster.tail(prog, int(index) if index else None, stream, lines)
+            for name, text in output.items():
+                print(f"{CYAN}==> {name} ({stream}) <=={RESET}")
+                if text:
+                    print(text)
+
+        def cmd_attach(self, target):
+            prog, _, index = target.split()[0].partition(":")
+            if index and not index.isdigit():
+                print(f"{RED}Error: Invalid instance '{target}'.{RESET}")
+                return
+            try:
+                info = self.Taskmaster.console_target(prog, int(index) if index else None)
+            except ValueError as e:
+                print(f"{RED}Error: {e}{RESET}")
+                return
+            ours, theirs = socket.socketpair()
+            size = os.get_terminal_size() if os.isatty(sys.stdout.fileno()) else None
+            self.Taskmaster.console.attach(prog, info["index"], theirs,
+                                           size.lines if size else None, size.columns if size else None)
+            console_session(ours)
+
+        def cmd_events(self, target):
+            words = target.split()
+            prog, _, index = words[0].partition(":")
+            since = None
+            limit = 50
+            rest = iter(words[1:])
+            for word in rest:
+                if word == "--since":
+                    since = parse_since(next(rest, ""))
+                elif word == "--limit":
+                    limit = int(next(rest, "0"))
+                elif word.startswith("--since="):
+                    since = parse_since(word.split("=", 1)[1])
+            result = self.Taskmaster.events_data(prog, since, int(index) if index else None, limit)
+            print_events(result)
+
+        def cmd_metrics(self, target):
+            progs = target.split() if target else None
+            print(json.dumps(self.Taskmaster.metrics_data(progs), indent=2))
+
         def cmd_reload_config(self):
-            changed = self.Taskmaster.reload_config()
+            try:
+                changed = self.Taskmaster.reload_config()
+            except Exception as e:
+                self.Taskmaster.log_info(f"Configuration reload failed ({e})")
+                print(f"{RED}Error: configuration not reloaded: {e}{RESET}")
+                return
             if changed:
                 print(f"{GREEN}Configuration reloaded successfully.{RESET}")
+                for prog, action in self.Taskmaster.reload_summary.items():
+                    print(f"  {prog:<15} {action}")
             else:
                 print(f"{GREEN}Configuration reloaded, Nothing Changed!{RESET}")
             
@@ -92,7 +2386,9 @@ class ControlShell:
         def check_program(self, cmd, target):
       
             
-            if cmd == "start" or cmd == "stop" or cmd == "restart":
+            if cmd in ("rolling-restart", "tail", "events", "attach") and target is not None:
+                target = target.split()[0].split(":")[0]
+            if cmd == "start" or cmd == "stop" or cmd == "restart" or cmd == "rolling-restart" or cmd == "tail" or cmd == "events" or cmd == "attach":
                 if target is None:
                     print(f"{RED}Error: No program specified for '{cmd}' command.{RESET}")
                     return True            
@@ -100,13 +2396,13 @@ class ControlShell:
                     print(f"{RED}Error: Program '{target}' not found.{RESET}")
                     return True
                 if  cmd == "start":
-                    items = self.Taskmaster.programs[target]
-                    if items.get("status") == "STARTED":
+                    state = self.Taskmaster.programs[target]
+                    if state.status == ProgramStatus.STARTED:
                         print(f"{GREEN}Program '{target}' is already running.{RESET}")
                         return True
-                if cmd == "stop" or cmd == "restart":
-                    items = self.Taskmaster.programs[target]
-                    if items.get('status') != "STARTED":
+                if cmd == "stop" or cmd == "restart" or cmd == "rolling-restart":
+                    state = self.Taskmaster.programs[target]
+                    if state.status not in (ProgramStatus.STARTED, ProgramStatus.BACKOFF):
                         print(f"{RED}Program '{target}' is not running.{RESET}")
                         return True
                 return None
@@ -145,6 +2441,18 @@ class ControlShell:
                 
                     elif cmd == "status" and target is None:
                         self.cmd_status()
+
+                    elif cmd == "status" and target == "-v":
+                        self.cmd_status(verbose=True)
+
+                    elif cmd == "metrics":
+                        self.cmd_metrics(target)
+
+                    elif cmd == "events":
+                        try:
+                            self.cmd_events(target)
+                        except ValueError as e:
+                            print(f"{RED}Error: {e}{RESET}")
                     
 
                     elif cmd == "reload" and target is None:
@@ -158,10 +2466,21 @@ class ControlShell:
                         
                     elif cmd == "restart":
                         self.cmd_restart(target)
+
+                    elif cmd == "tail":
+                        self.cmd_tail(target)
+
+                    elif cmd == "attach":
+                        self.cmd_attach(target)
+
+                    elif cmd == "rolling-restart":
+                        self.cmd_rolling_restart(target)
                 
                     else:
                         print(f"{RED}Unknown command: '{cmd}'{RESET}")
                 
+                except ValueError as e:
+                    print(f"{RED}Error: {e}{RESET}")
                 except KeyboardInterrupt:
                     print(f"\n{YELLOW}Use 'quit' to exit{RESET}")
                 except EOFError:
@@ -177,7 +2496,25 @@ class TaskMaster:
             self.logfie = {}
             self.reload_requested = False
             self.shutdown_requested = False
-            self.lock = threading.Lock()
+            self.wakeup = threading.Event()
+            self.ready = threading.Event()
+            self.ready_file = None
+            self.control_server = None
+            self.locks_lock = threading.Lock()
+            self.program_locks = {}
+            self.snapshot_lock = threading.Lock()
+            self.snapshot = {}
+            self.reaper = ChildReaper()
+            self.timers = TimerScheduler(wake=self.reaper.wake)
+            self.output = OutputCapture()
+            self.console = ConsoleMux()
+            self.metrics = MetricsSampler(self)
+            self.journal = StateJournal()
+            self.sockets = SocketManager()
+            self.health = HealthChecker(self)
+            self.logger = LogWriter(LOGFILE)
+            self.events = EventJournal()
+            self.alerts = AlertDispatcher(on_error=self._alert_failed)
 
             self.defaults = {
                 "numprocs": 1,
@@ -193,9 +2530,60 @@ class TaskMaster:
                 "env": {},
                 "workingdir": None,
                 "umask": None,
+                "priority": DEFAULT_PRIORITY,
+                "restart_strategy": "all",
+                "rolling_batch": 1,
+                "rolling_min_available": 0,
+                "backoff_base": 0.5,
+                "backoff_max": 30,
+                "backoff_jitter": 0.2,
+                "retry_reset": 60,
+                "crashloop_threshold": 0,
+                "crashloop_window": 60,
+                "capture": True,
+                "stdout_maxbytes": OUTPUT_MAX_BYTES,
+                "stdout_backups": OUTPUT_BACKUPS,
+                "stderr_maxbytes": OUTPUT_MAX_BYTES,
+                "stderr_backups": OUTPUT_BACKUPS,
+                "tail_bytes": TAIL_BUFFER,
+                "max_rss": None,
+                "max_cpu": None,
+                "socket": None,
+                "socket_reuseport": False,
+                "socket_backlog": SOCKET_BACKLOG,
+                "healthcheck": None,
+                "console": None,
+                "console_scrollback": TAIL_BUFFER,
             }
+            self.settings_defaults = {
+                "log_max_bytes": LOG_MAX_BYTES,
+                "log_backups": LOG_BACKUPS,
+                "spawn_parallelism": SPAWN_PARALLELISM,
+                "socket": SOCKFILE,
+                "metrics_interval": METRICS_INTERVAL,
+                "metrics_history": METRICS_HISTORY,
+                "probe_concurrency": PROBE_CONCURRENCY,
+                "events_dir": EVENTS_DIR,
+                "events_segment_bytes": EVENTS_SEGMENT_BYTES,
+                "events_retention_days": EVENTS_RETENTION_DAYS,
+                "state_file": STATEFILE,
+                "adopt": False,
+                "keep_children": False,
+                "alerts": None,
+            }
+            self.settings = dict(self.settings_defaults)
+            self.spawner = None
+            self.spawner_size = 0
+            self.reload_summary = {}
+            self.hashes = {}
+            self.keep_children = False
+            self.base_env = dict(os.environ)
+            self.config_stamp = None
+            self.config_digest = None
+            self.config_cache = None
+            self.fd_limit = raise_fd_limit()
             
-        def log_info(self, message, prog=None, pid=None, instance=None):
+        def log_info(self, message, prog=None, pid=None, instance=None, data=None):
             timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
             
             
@@ -207,6 +2595,8 @@ class TaskMaster:
                 symbol = "↻"
             elif message == "Failed":
                 symbol = "✖"
+            else:
+                symbol = "•"
             if prog and pid:
                 name = f"{prog}:{instance}" if instance is not None else prog
                 log_line = f"{symbol} [{timestamp}] [{name}] [PID:{pid}] {message}"
@@ -216,9 +2606,23 @@ class TaskMaster:
             else:
                 symbol = "↻"
                 log_line = f"{symbol} [{timestamp}] {message}"
-            with open(LOGFILE, "a") as log_file:
-                log_file.write(f"{log_line}\n")
-                time.sleep(0.5)       
+            if data:
+                log_line += " " + format_event_data(data)
+            self.logger.write(log_line)
+            event = {"t": round(time.time(), 3), "e": message}
+            if prog:
+                event["p"] = prog
+            if instance is not None:
+                event["i"] = instance
+            if pid:
+                event["pid"] = pid
+            if data:
+                event["d"] = data
+            self.events.write(event)
+            self.alerts.notify(event)
+
+        def _alert_failed(self, channel, error):
+            self.log_info(f"Alert delivery failed ({channel}: {error})")
 
         def _parse_exitcodes(self, value):
             if value is None:
@@ -227,6 +2631,15 @@ class TaskMaster:
                 return value
             return [value]
 
+        def _parse_size(self, value):
+            if value is None:
+                return None
+            text = str(value).strip().upper().rstrip("B")
+            units = {"K": 1024, "M": 1024 ** 2, "G": 1024 ** 3}
+            if text and text[-1] in units:
+                return int(float(text[:-1]) * units[text[-1]])
+            return int(float(text))
+
         def _parse_umask(self, value):
             if value is None:
                 return None
@@ -251,19 +2664,71 @@ class TaskMaster:
             normalized["starttime"] = int(normalized.get("starttime", 0))
             normalized["startretries"] = int(normalized.get("startretries", 0))
             normalized["stoptime"] = int(normalized.get("stoptime", 10))
+            normalized["priority"] = int(normalized.get("priority", DEFAULT_PRIORITY))
             normalized["umask"] = self._parse_umask(normalized.get("umask"))
             normalized["stopsignal"] = normalized.get("stopsignal", "TERM")
-            normalized["procs"] = normalized.get("procs", [])
-            normalized["status"] = normalized.get("status", "CREATED")
             normalized["cmd"] = normalized.get("cmd", "")
+            normalized["restart_strategy"] = str(normalized.get("restart_strategy") or "all").lower()
+            normalized["max_rss"] = self._parse_size(normalized.get("max_rss"))
+            if isinstance(normalized.get("socket"), int):
+                normalized["socket"] = f":{normalized['socket']}"
+            if normalized.get("console"):
+                normalized["console"] = str(normalized["console"]).lower()
+                if normalized["console"] != "pty":
+                    raise ConfigError(f"unsupported console '{normalized['console']}'")
+            if normalized.get("max_cpu") is not None:
+                normalized["max_cpu"] = float(normalized["max_cpu"])
+            for key in ("rolling_batch", "rolling_min_available"):
+                self._resolve_count(normalized.get(key), normalized["numprocs"])
+            if normalized.get("healthcheck"):
+                normalized["healthcheck"] = self._normalize_healthcheck(prog, normalized)
             return normalized
 
+        def _normalize_healthcheck(self, prog, item):
+            spec = dict(HEALTHCHECK_DEFAULTS)
+            spec.update(item["healthcheck"])
+            spec["type"] = str(spec["type"]).lower()
+            if spec["type"] not in ("tcp", "http", "exec"):
+                raise ConfigError(f"unknown healthcheck type '{spec['type']}'")
+            if spec["type"] == "exec" and not spec["command"]:
+                raise ConfigError("exec healthcheck needs a command")
+            if spec["type"] != "exec" and spec["port"] is None:
+                listen = str(item.get("socket") or "")
+                if listen and not listen.startswith("unix://"):
+                    spec["port"] = int(listen.rpartition(":")[2])
+                else:
+                    raise ConfigError(f"{spec['type']} healthcheck needs a port")
+            if spec["grace"] is None:
+                spec["grace"] = item.get("starttime", 0)
+            for key in ("interval", "timeout", "grace"):
+                spec[key] = float(spec[key])
+            for key in ("healthy_threshold", "unhealthy_threshold"):
+                spec[key] = max(1, int(spec[key]))
+            return spec
+
         def _build_env(self, item):
-            env = os.environ.copy()
+            env = dict(self.base_env)
             extra = item.get("env") or {}
             env.update({str(k): str(v) for k, v in extra.items()})
             return env
 
+        def _spec(self, state):
+            spec = state.spec
+            if spec is None or spec.config is not state.config:
+                spec = state.spec = self._compile_spec(state.name, state.config)
+            return spec
+
+        def _compile_spec(self, prog, item):
+            argv = shlex.split(item.get("cmd", ""))
+            command_env = self._build_env(item)
+            env = command_env
+            if item.get("socket"):
+                argv = self._activation_argv(argv, console=item.get("console") == "pty")
+                env = dict(command_env, LISTEN_FDS="1", LISTEN_FDNAMES=prog)
+            elif item.get("console") == "pty":
+                argv = self._console_argv(argv)
+            return ProgramSpec(item, argv, env, self._resolve_signal(item.get("stopsignal")), command_env)
+
         def _open_output(self, path):
             if not path:
                 return subprocess.DEVNULL
@@ -271,57 +2736,396 @@ class TaskMaster:
                 return subprocess.DEVNULL
             return open(path, "a")
 
-        def _start_process(self, prog, item, index):
-            cmd = item.get("cmd", "")
-            argv = shlex.split(cmd)
-            env = self._build_env(item)
-            cwd = item.get("workingdir")
-            umask_value = item.get("umask")
-
-            stdout_handle = self._open_output(item.get("stdout"))
-            stderr_handle = self._open_output(item.get("stderr"))
-
-            def _apply_umask():
-                if umask_value is not None:
-                    os.umask(umask_value)
-
-            proc = subprocess.Popen(
-                argv,
-                stdout=stdout_handle,
-                stderr=stderr_handle,
-                env=env,
-                cwd=cwd,
-                preexec_fn=_apply_umask if umask_value is not None else None,
-            )
+        def _capture_output(self, state, index, stream):
+            item = state.config
+            path = item.get(stream)
+            sink = None
+            if path and str(path).lower() != "discard":
+                sink = self.output.sink(path, item.get(f"{stream}_maxbytes", OUTPUT_MAX_BYTES),
+                                        item.get(f"{stream}_backups", OUTPUT_BACKUPS))
+            return self.output.open_pipe(state.name, index, stream, sink, item.get("tail_bytes", TAIL_BUFFER))
 
-            proc_info = {
-                "proc": proc,
-                "start_time": time.time(),
-                "retries": 0,
-                "stdout_handle": stdout_handle,
-                "stderr_handle": stderr_handle,
-                "index": index,
-            }
-            return proc_info
+        def _open_console(self, state, index):
+            item = state.config
+            sink = None
+            path = item.get("stdout")
+            if path and str(path).lower() != "discard":
+                sink = self.output.sink(path, item.get("stdout_maxbytes", OUTPUT_MAX_BYTES),
+                                        item.get("stdout_backups", OUTPUT_BACKUPS))
+            return self.console.open(state.name, index, sink, item.get("console_scrollback", TAIL_BUFFER))
+
+        def _start_process(self, state, index):
+            spec = self._spec(state)
+            item = spec.config
+            console = item.get("console") == "pty"
+            listener = self.sockets.fd(state.name, index, item) if item.get("socket") else None
+
+            if console:
+                stdout_target = stderr_target = self._open_console(state, index)
+                stdout_handle = stderr_handle = None
+            elif item.get("capture", True):
+                stdout_target = self._capture_output(state, index, "stdout")
+                stderr_target = self._capture_output(state, index, "stderr")
+                stdout_handle = stderr_handle = None
+            else:
+                stdout_target = stdout_handle = self._open_output(item.get("stdout"))
+                stderr_target = stderr_handle = self._open_output(item.get("stderr"))
+
+            stdin_target = stdout_target if console else None
+            if listener is not None:
+                stdin_target = listener
+
+            try:
+                proc = subprocess.Popen(
+                    spec.argv,
+                    stdin=stdin_target,
+                    stdout=stdout_target,
+                    stderr=stderr_target,
+                    env=spec.env,
+                    cwd=spec.cwd,
+                    umask=spec.umask,
+                    start_new_session=console,
+                )
+            except Exception:
+                self._close_handles(stdout_handle, stderr_handle)
+                raise
+            finally:
+                if console:
+                    os.close(stdout_target)
+                elif item.get("capture", True):
+                    os.close(stdout_target)
+                    os.close(stderr_target)
+
+            inst = InstanceState(state.name, index, proc, stdout_handle, stderr_handle)
+            if self.journal.fd is not None:
+                inst.start_ticks = proc_start_ticks(proc.pid)
+            self.reaper.watch(proc, inst)
+            self._schedule_instance_timers(state, inst)
+            return inst
+
+        def _activation_argv(self, argv, console=False):
+            stdin = "0<>/proc/self/fd/1" if console else "0</dev/null"
+            script = f"export LISTEN_PID=$$; exec \"$@\" {LISTEN_FDS_START}<&0 {stdin}"
+            return ["/bin/sh", "-c", script, argv[0]] + argv
+
+        def _console_argv(self, argv):
+            return ["/bin/sh", "-c", "exec \"$@\" 0<>/proc/self/fd/1", argv[0]] + argv
+
+        def _schedule_instance_timers(self, state, inst):
+            self.timers.call_later(state.config.get("starttime", 0), self._locked_timer,
+                                   state.name, self._promote_instance, state, inst)
+
+        def _watch_health(self, state, inst):
+            if state.config.get("healthcheck"):
+                self.health.watch(state, inst)
+            self.timers.call_later(float(state.config.get("retry_reset", 60)), self._locked_timer,
+                                   state.name, self._reset_backoff, state, inst)
+
+        def _locked_timer(self, prog, callback, *args):
+            lock = self._program_lock(prog)
+            if not lock.acquire(blocking=False):
+                self.timers.call_later(0.05, self._locked_timer, prog, callback, *args)
+                return
+            try:
+                callback(*args)
+            finally:
+                lock.release()
+
+        def _promote_instance(self, state, inst):
+            if state.owns(inst) and inst.state == InstanceStatus.STARTING and inst.proc.poll() is None:
+                if state.config.get("healthcheck") and inst.health != "healthy":
+                    return
+                state.transition(inst, InstanceStatus.RUNNING)
+                self._publish(state.name)
+
+        def _probe_result(self, state, inst, ok, detail):
+            spec = state.config.get("healthcheck")
+            if not spec or not state.owns(inst) or inst.state not in (InstanceStatus.STARTING, InstanceStatus.RUNNING):
+                return
+            if ok:
+                inst.probe_failures = 0
+                inst.probe_successes += 1
+                if inst.health != "healthy" and inst.probe_successes >= spec["healthy_threshold"]:
+                    inst.health = "healthy"
+                    self.log_info("Healthy", state.name, inst.pid, instance=inst.index)
+                    if time.time() - inst.start_time >= state.config.get("starttime", 0):
+                        self._promote_instance(state, inst)
+                    self._publish(state.name)
+                return
+            inst.probe_successes = 0
+            if inst.health != "healthy" and time.time() - inst.start_time < spec["grace"]:
+                return
+            inst.probe_failures += 1
+            if inst.probe_failures >= spec["unhealthy_threshold"] and inst.health != "unhealthy":
+                inst.health = "unhealthy"
+                self.log_info(f"Unhealthy ({detail})", state.name, inst.pid, instance=inst.index)
+                try:
+                    inst.proc.send_signal(self._spec(state).stopsignal)
+                except Exception:
+                    pass
+                self.timers.call_later(state.config.get("stoptime", 10), self._locked_timer,
+                                       state.name, self._kill_unhealthy, state, inst)
+                self._publish(state.name)
+
+        def _kill_unhealthy(self, state, inst):
+            if state.owns(inst) and inst.health == "unhealthy" and inst.proc.poll() is None:
+                try:
+                    inst.proc.kill()
+                except Exception:
+                    pass
+
+        def _reset_backoff(self, state, inst):
+            if not state.owns(inst) or inst.state not in ALIVE_STATES:
+                return
+            inst.retries = 0
+            inst.restarts = 0
+            self._expire_exits(state)
+            if state.crashloop and not state.exit_times:
+                state.crashloop = False
+                self.log_info("Crash loop cleared", state.name)
+                self._publish(state.name)
+
+        def _expire_exits(self, state):
+            horizon = time.monotonic() - float(state.config.get("crashloop_window", 60))
+            while state.exit_times and state.exit_times[0] < horizon:
+                state.exit_times.popleft()
+
+        def _record_exit(self, state):
+            state.exit_times.append(time.monotonic())
+            self._expire_exits(state)
+            threshold = int(state.config.get("crashloop_threshold") or 0)
+            if threshold <= 0:
+                threshold = max(5, 2 * state.config.get("numprocs", 1))
+            if not state.crashloop and len(state.exit_times) >= threshold:
+                state.crashloop = True
+                self.log_info("Crash loop detected", state.name)
+
+        def _restart_delay(self, state, inst):
+            cfg = state.config
+            ceiling = float(cfg.get("backoff_max", 30))
+            if state.crashloop:
+                delay = ceiling
+            else:
+                delay = min(ceiling, float(cfg.get("backoff_base", 0.5)) * (2 ** inst.restarts))
+            return delay * (1 + float(cfg.get("backoff_jitter", 0)) * random.random())
+
+        def _restart_instance(self, state, inst):
+            if not state.owns(inst) or inst.state != InstanceStatus.BACKOFF:
+                return
+            try:
+                new_inst = self._start_process(state, inst.index)
+            except Exception:
+                state.transition(inst, InstanceStatus.FATAL)
+                self.log_info("Failed", inst.program, instance=inst.index)
+                self._update_program_status(state)
+                return
+            new_inst.retries = inst.retries
+            new_inst.restarts = inst.restarts
+            state.add(new_inst)
+            self._watch_health(state, new_inst)
+            self.log_info("Started", inst.program, new_inst.pid, instance=new_inst.index)
+            self._update_program_status(state)
+
+        def stop_instance_async(self, state, inst, on_stopped=None):
+            if not state.owns(inst) or inst.state not in ALIVE_STATES:
+                return False
+            state.transition(inst, InstanceStatus.STOPPING)
+            inst.on_stopped = on_stopped
+            try:
+                inst.proc.send_signal(self._spec(state).stopsignal)
+            except Exception:
+                pass
+            self.timers.call_later(state.config.get("stoptime", 10), self._locked_timer,
+                                   state.name, self._escalate_stop, state, inst)
+            self._publish(state.name)
+            return True
+
+        def check_limits(self, state, inst, ring):
+            max_rss = state.config.get("max_rss")
+            max_cpu = state.config.get("max_cpu")
+            data = None
+            if max_rss and ring[-1]["rss"] > max_rss:
+                data = {"limit": "max_rss", "value": ring[-1]["rss"], "max": max_rss}
+            elif max_cpu and len(ring) >= 3 and all(s["cpu"] > max_cpu for s in list(ring)[-3:]):
+                data = {"limit": "max_cpu", "value": ring[-1]["cpu"], "max": max_cpu}
+            if data is not None:
+                self.timers.call_later(0, self._locked_timer, state.name,
+                                       self._enforce_limit, state, inst, data)
+
+        def _enforce_limit(self, state, inst, data):
+            if (not state.owns(inst) or inst.limit is not None
+                    or inst.state not in (InstanceStatus.STARTING, InstanceStatus.RUNNING)):
+                return
+            inst.limit = data
+            self.log_info("Limit exceeded", state.name, inst.pid, instance=inst.index, data=data)
+            try:
+                inst.proc.send_signal(self._spec(state).stopsignal)
+            except Exception:
+                pass
+            self.timers.call_later(state.config.get("stoptime", 10), self._locked_timer,
+                                   state.name, self._kill_over_limit, state, inst)
+            self._publish(state.name)
+
+        def _kill_over_limit(self, state, inst):
+            if state.owns(inst) and inst.limit is not None and inst.proc.poll() is None:
+                try:
+                    inst.proc.kill()
+                except Exception:
+                    pass
 
-        def _close_output_handles(self, proc_info):
-            for key in ("stdout_handle", "stderr_handle"):
-                handle = proc_info.get(key)
+        def _respawn_instance(self, state, inst):
+            if state.name in self.programs and inst.index <= state.config.get("numprocs", 1):
+                self._spawn_instances([(state, inst.index)])
+
+        def _escalate_stop(self, state, inst):
+            if inst.state == InstanceStatus.STOPPING and inst.proc.poll() is None:
+                try:
+                    inst.proc.kill()
+                except Exception:
+                    pass
+
+        def _finish_async_stop(self, state, inst):
+            state.transition(inst, InstanceStatus.STOPPED)
+            self.log_info("Stopped", state.name, inst.pid, instance=inst.index)
+            self._close_output_handles(inst)
+            state.remove(inst)
+            self._update_program_status(state)
+            if inst.on_stopped is not None:
+                inst.on_stopped(state, inst)
+
+        def _close_handles(self, *handles):
+            for handle in handles:
                 if handle not in (None, subprocess.DEVNULL):
                     try:
                         handle.close()
                     except Exception:
                         pass
 
-        def _update_program_status(self, item):
-            procs = item.get("procs", [])
-            running = [p for p in procs if p.get("proc") and p["proc"].poll() is None]
-            if running:
-                item["status"] = "STARTED"
-            elif procs:
-                item["status"] = "STOPPED"
-            else:
-                item["status"] = "CREATED"
+        def _close_output_handles(self, inst):
+            self._close_handles(inst.stdout_handle, inst.stderr_handle)
+            inst.stdout_handle = None
+            inst.stderr_handle = None
+
+        def _update_program_status(self, state):
+            state.refresh_status()
+            self._publish(state.name)
+
+        def _program_lock(self, prog):
+            with self.locks_lock:
+                lock = self.program_locks.get(prog)
+                if lock is None:
+                    lock = self.program_locks[prog] = threading.RLock()
+                return lock
+
+        @contextlib.contextmanager
+        def _locked(self, progs):
+            with contextlib.ExitStack() as stack:
+                for prog in sorted(set(progs)):
+                    stack.enter_context(self._program_lock(prog))
+                yield
+
+        def _publish(self, prog):
+            with self.snapshot_lock:
+                snapshot = dict(self.snapshot)
+                if prog in self.programs:
+                    snapshot[prog] = self.program_status(prog)
+                else:
+                    snapshot.pop(prog, None)
+                self.snapshot = snapshot
+            self.journal.record(prog, self._journal_record(prog))
+
+        def _config_hash(self, state):
+            cached = self.hashes.get(state.name)
+            if cached is not None and cached[0] is state.config:
+                return cached[1]
+            data = json.dumps(self._config_signature(state.config), sort_keys=True, default=str)
+            digest = hashlib.sha1(data.encode()).hexdigest()[:16]
+            self.hashes[state.name] = (state.config, digest)
+            return digest
+
+        def _journal_record(self, prog):
+            state = self.programs.get(prog)
+            if state is None:
+                return None
+            instances = [
+                [inst.index, inst.pid, inst.start_ticks, round(inst.start_time, 3), inst.retries, inst.restarts]
+                for index, inst in sorted(state.instances.items())
+                if inst.state in ALIVE_STATES and inst.start_ticks is not None
+            ]
+            return {"p": prog, "s": self._config_hash(state), "i": instances}
+
+        def open_events(self):
+            if self.events.path is None and self.settings.get("events_dir"):
+                self.events.open(self.settings.get("events_dir"))
+
+        def open_journal(self, adopt=None):
+            self.open_events()
+            path = self.settings.get("state_file")
+            if not path:
+                return 0
+            if adopt is None:
+                adopt = self.settings.get("adopt")
+            self.journal.path = path
+            records = self.journal.load() if adopt else {}
+            adopted = self.adopt_children(records) if records else 0
+            self.journal.open({prog: self._journal_record(prog) for prog in self.programs})
+            return adopted
+
+        def adopt_children(self, records):
+            if not hasattr(os, "pidfd_open"):
+                self.log_info("Re-adoption needs pidfd_open, starting fresh")
+                return 0
+            adopted = 0
+            for prog, record in records.items():
+                state = self.programs.get(prog)
+                for index, pid, ticks, start_time, retries, restarts in record.get("i", []):
+                    proc = AdoptedProcess.attach(pid, ticks)
+                    if proc is None:
+                        continue
+                    if state is None:
+                        proc.terminate()
+                        proc._close()
+                        self.log_info("Stopped", prog, pid, instance=index)
+                        continue
+                    with self._locked([prog]):
+                        inst = InstanceState(prog, index, proc)
+                        inst.start_time = start_time
+                        inst.start_ticks = ticks
+                        inst.retries = retries
+                        inst.restarts = restarts
+                        if time.time() - start_time >= state.config.get("starttime", 0):
+                            inst.state = InstanceStatus.RUNNING
+                        state.add(inst)
+                        self.reaper.watch(proc, inst)
+                        self._schedule_instance_timers(state, inst)
+                        self._watch_health(state, inst)
+                        self.log_info("Adopted", prog, pid, instance=index)
+                        adopted += 1
+                        numprocs = state.config.get("numprocs", 1)
+                        if index > numprocs:
+                            self.stop_instance_async(state, inst)
+                        elif record.get("s") != self._config_hash(state):
+                            self.log_info("Configuration changed, restarting", prog, pid, instance=index)
+                            self.stop_instance_async(state, inst, on_stopped=self._respawn_instance)
+                        self._update_program_status(state)
+            return adopted
+
+        def detach_children(self):
+            detached = set()
+            for prog in list(self.programs):
+                with self._locked([prog]):
+                    state = self.programs[prog]
+                    if (state.config.get("capture", True) or state.config.get("socket")
+                            or state.config.get("console")):
+                        continue
+                    for inst in list(state.instances.values()):
+                        if inst.state in ALIVE_STATES:
+                            self.reaper.unwatch(inst.proc)
+                            self.log_info("Detached", prog, inst.pid, instance=inst.index)
+                    state.clear()
+                    state.refresh_status()
+                    detached.add(prog)
+            return detached
 
         def _config_signature(self, item):
             keys = [
@@ -339,60 +3143,433 @@ class TaskMaster:
                 "env",
                 "workingdir",
                 "umask",
+                "priority",
+                "restart_strategy",
+                "rolling_batch",
+                "rolling_min_available",
+                "backoff_base",
+                "backoff_max",
+                "backoff_jitter",
+                "retry_reset",
+                "crashloop_threshold",
+                "crashloop_window",
+                "capture",
+                "stdout_maxbytes",
+                "stdout_backups",
+                "stderr_maxbytes",
+                "stderr_backups",
+                "tail_bytes",
+                "max_rss",
+                "max_cpu",
+                "socket",
+                "socket_reuseport",
+                "socket_backlog",
+                "healthcheck",
+                "console",
+                "console_scrollback",
             ]
             return {k: item.get(k) for k in keys}
 
+        def _diff_config(self, old, new):
+            old_sig = self._config_signature(old)
+            new_sig = self._config_signature(new)
+            changed = {k for k in new_sig if old_sig[k] != new_sig[k]}
+            return changed & RESTART_FIELDS, changed - RESTART_FIELDS
+
+        def _get_spawner(self):
+            size = max(1, int(self.settings.get("spawn_parallelism", SPAWN_PARALLELISM)))
+            if self.spawner is None or self.spawner_size != size:
+                if self.spawner is not None:
+                    self.spawner.shutdown(wait=False)
+                self.spawner = ThreadPoolExecutor(max_workers=size, thread_name_prefix="spawn")
+                self.spawner_size = size
+            return self.spawner
+
+        def _spawn_one(self, state, index):
+            prog = state.name
+            try:
+                inst = self._start_process(state, index)
+            except Exception as e:
+                self.log_info("Failed", prog, instance=index)
+                return {"program": prog, "index": index, "pid": None, "error": str(e)}, None
+            self.log_info("Started", prog, inst.pid, instance=index)
+            return {"program": prog, "index": index, "pid": inst.pid, "error": None}, inst
+
+        def _spawn_instances(self, requests):
+            if not requests:
+                return []
+            if len(requests) == 1:
+                outcomes = [self._spawn_one(*requests[0])]
+            else:
+                outcomes = list(self._get_spawner().map(lambda r: self._spawn_one(*r), requests))
+            results = []
+            touched = {}
+            for (state, index), (result, inst) in zip(requests, outcomes):
+                results.append(result)
+                state.spawn_results[index] = result
+                if inst is not None:
+                    state.add(inst)
+                    self._watch_health(state, inst)
+                touched[state.name] = state
+            for state in touched.values():
+                self._update_program_status(state)
+            return results
+
+        def _missing_instances(self, state, backoff=False):
+            missing = []
+            for index in range(1, state.config.get("numprocs", 1) + 1):
+                inst = state.instances.get(index)
+                if inst is None or inst.state not in ALIVE_STATES and (backoff or inst.state != InstanceStatus.BACKOFF):
+                    missing.append((state, index))
+            return missing
+
         def start_program(self, prog):
-            item = self.programs.get(prog)
-            if not item:
-                return
-            with self.lock:
-                procs = item.get("procs", [])
-                target = item.get("numprocs", 1)
-                while len(procs) < target:
-                    index = len(procs) + 1
+            state = self.programs.get(prog)
+            if not state:
+                return []
+            with self._locked([prog]):
+                return self._spawn_instances(self._missing_instances(state, backoff=True))
+
+        def start_programs(self, progs):
+            waves = {}
+            for prog in progs:
+                state = self.programs.get(prog)
+                if state:
+                    waves.setdefault(state.config.get("priority", DEFAULT_PRIORITY), []).append(prog)
+            results = []
+            for priority in sorted(waves):
+                with self._locked(waves[priority]):
+                    requests = []
+                    for prog in waves[priority]:
+                        if prog in self.programs:
+                            requests.extend(self._missing_instances(self.programs[prog], backoff=True))
+                    results.extend(self._spawn_instances(requests))
+            return results
+
+        def _stop_targets(self, state):
+            stopsignal = self._spec(state).stopsignal
+            stoptime = state.config.get("stoptime", 10)
+            return [(state, inst, stopsignal, stoptime) for inst in list(state.instances.values())
+                    if inst.state in ALIVE_STATES]
+
+        def _stop_instances(self, targets):
+            selector = selectors.DefaultSelector()
+            pending = {}
+            now = time.monotonic()
+            for state, inst, stopsignal, stoptime in targets:
+                proc = inst.proc
+                self.reaper.unwatch(proc)
+                state.transition(inst, InstanceStatus.STOPPING)
+                try:
+                    proc.send_signal(stopsignal)
+                except Exception:
+                    pass
+                pidfd = None
+                if self.reaper.use_pidfd:
                     try:
-                        proc_info = self._start_process(prog, item, index)
-                        procs.append(proc_info)
-                        self.log_info("Started", prog, proc_info["proc"].pid, instance=index)
-                    except Exception:
-                        self.log_info("Failed", prog, instance=index)
-                        break
-                item["procs"] = procs
-                self._update_program_status(item)
+                        pidfd = os.pidfd_open(proc.pid)
+                        selector.register(pidfd, selectors.EVENT_READ, proc.pid)
+                    except OSError:
+                        pidfd = None
+                pending[proc.pid] = (state, inst, now + stoptime, pidfd)
 
-        def stop_program(self, prog):
-            item = self.programs.get(prog)
-            if not item:
-                return
-            stopsignal = self._resolve_signal(item.get("stopsignal"))
-            stoptime = item.get("stoptime", 10)
-            with self.lock:
-                for proc_info in list(item.get("procs", [])):
-                    proc = proc_info.get("proc")
-                    if proc is None:
+            while pending:
+                for pid, (state, inst, deadline, pidfd) in list(pending.items()):
+                    proc = inst.proc
+                    if proc.poll() is None and time.monotonic() >= deadline:
+                        try:
+                            proc.kill()
+                            proc.wait(timeout=1)
+                        except Exception:
+                            pass
+                    if proc.poll() is None:
                         continue
-                    try:
-                        proc.send_signal(stopsignal)
-                        proc.wait(timeout=stoptime)
-                    except subprocess.TimeoutExpired:
-                        proc.kill()
-                    except Exception:
-                        pass
-                    self.log_info("Stopped", prog, proc.pid, instance=proc_info.get("index"))
-                    self._close_output_handles(proc_info)
-                item["procs"] = []
-                self._update_program_status(item)
+                    if pidfd is not None:
+                        selector.unregister(pidfd)
+                        os.close(pidfd)
+                    del pending[pid]
+                    state.transition(inst, InstanceStatus.STOPPED)
+                    self.log_info("Stopped", state.name, pid, instance=inst.index)
+                    self._close_output_handles(inst)
+                if not pending:
+                    break
+                timeout = max(0, min(entry[2] for entry in pending.values()) - time.monotonic())
+                if any(entry[3] is None for entry in pending.values()):
+                    timeout = min(timeout, 0.05)
+                selector.select(timeout)
+            selector.close()
 
-        def restart_program(self, prog):
-            self.stop_program(prog)
-            time.sleep(1)
-            self.start_program(prog)
+        def stop_programs(self, progs):
+            with self._locked(progs):
+                states = [self.programs[prog] for prog in progs if prog in self.programs]
+                targets = []
+                for state in states:
+                    targets.extend(self._stop_targets(state))
+                self._stop_instances(targets)
+                for state in states:
+                    state.clear()
+                    self._update_program_status(state)
+
+        def _stop_indexes(self, state, indexes):
+            stopsignal = self._spec(state).stopsignal
+            stoptime = state.config.get("stoptime", 10)
+            insts = [state.instances[index] for index in indexes if index in state.instances]
+            self._stop_instances([(state, inst, stopsignal, stoptime)
+                                  for inst in insts if inst.state in ALIVE_STATES])
+            for inst in insts:
+                state.remove(inst)
+            self._update_program_status(state)
+
+        def _apply_live_changes(self, state, config, spawn=True):
+            old_numprocs = state.config.get("numprocs", 1)
+            state.config = config
+            if config.get("console"):
+                self.console.set_scrollback(state.name, config.get("console_scrollback", TAIL_BUFFER))
+            for inst in list(state.instances.values()):
+                if inst.state not in (InstanceStatus.STARTING, InstanceStatus.RUNNING):
+                    continue
+                if config.get("healthcheck"):
+                    self.health.watch(state, inst)
+                elif time.time() - inst.start_time >= config.get("starttime", 0):
+                    self._promote_instance(state, inst)
+            numprocs = config.get("numprocs", 1)
+            if numprocs < old_numprocs:
+                self._stop_indexes(state, [i for i in state.instances if i > numprocs])
+                self.sockets.trim(state.name, numprocs)
+            elif numprocs > old_numprocs and state.instances and spawn:
+                self._spawn_instances(self._missing_instances(state))
+            else:
+                self._publish(state.name)
+
+        def stop_program(self, prog):
+            self.stop_programs([prog])
+
+        def _resolve_count(self, value, total):
+            try:
+                if isinstance(value, str) and value.strip().endswith("%"):
+                    return math.ceil(total * float(value.strip()[:-1]) / 100)
+                return int(value or 0)
+            except ValueError:
+                raise ValueError(f"invalid count '{value}' (expected N or N%)") from None
+
+        def _rolling_batch_size(self, state, total, batch=None):
+            size = self._resolve_count(batch or state.config.get("rolling_batch", 1), total)
+            floor = self._resolve_count(state.config.get("rolling_min_available", 0), total)
+            return min(max(1, size), total - floor)
+
+        def _wait_started(self, insts, starttime, healthcheck=None):
+            deadline = time.monotonic() + starttime
+            failed = []
+            for inst in insts:
+                try:
+                    inst.proc.wait(timeout=max(0, deadline - time.monotonic()))
+                    failed.append(inst)
+                except subprocess.TimeoutExpired:
+                    pass
+            if healthcheck:
+                failed.extend(inst for inst in insts if inst not in failed and not self._wait_healthy(inst, healthcheck))
+            return failed
+
+        def _wait_healthy(self, inst, spec):
+            state = self.programs[inst.program]
+            limit = max(spec["grace"] - (time.time() - inst.start_time), 0)
+            deadline = time.monotonic() + limit + spec["unhealthy_threshold"] * (spec["interval"] + spec["timeout"])
+            successes = 0
+            while inst.health != "healthy" and time.monotonic() < deadline and inst.proc.poll() is None:
+                ok, _ = self.health.check(state, inst, spec["timeout"] + 5)
+                successes = successes + 1 if ok else 0
+                if successes >= spec["healthy_threshold"]:
+                    inst.health = "healthy"
+                    self.log_info("Healthy", state.name, inst.pid, instance=inst.index)
+                    self._promote_instance(state, inst)
+                    break
+                time.sleep(min(spec["interval"], 1.0))
+            return inst.health == "healthy"
+
+        def rolling_restart_program(self, prog, batch=None):
+            state = self.programs.get(prog)
+            if not state:
+                return []
+            results = []
+            with self._locked([prog]):
+                indexes = sorted(state.instances)
+                if not indexes:
+                    return self.start_program(prog)
+                size = self._rolling_batch_size(state, len(indexes), batch)
+                if size < 1:
+                    self.log_info("Rolling restart rejected (rolling_min_available not below numprocs)", prog)
+                    return [{"program": prog, "index": index, "pid": None,
+                             "error": "rolling_min_available leaves no instance to restart"}
+                            for index in indexes]
+                for start in range(0, len(indexes), size):
+                    chunk = indexes[start:start + size]
+                    self._stop_indexes(state, chunk)
+                    spawned = self._spawn_instances([(state, index) for index in chunk])
+                    results.extend(spawned)
+                    new = [state.instances[r["index"]] for r in spawned if r["error"] is None]
+                    failed = self._wait_started(new, state.config.get("starttime", 0),
+                                                state.config.get("healthcheck"))
+                    if len(new) < len(chunk) or failed:
+                        for inst in failed:
+                            self.log_info("Failed", prog, inst.pid, instance=inst.index)
+                        for index in indexes[start + size:]:
+                            results.append({"program": prog, "index": index, "pid": None,
+                                            "error": "rolling restart aborted"})
+                        return results
+                self._spawn_instances(self._missing_instances(state))
             self.log_info("Restarted", prog)
+            return results
+
+        def restart_programs(self, progs, rolling=None, batch=None):
+            if rolling is None:
+                rolling_progs = [p for p in progs if p in self.programs
+                                 and self.programs[p].config.get("restart_strategy") == "rolling"]
+            else:
+                rolling_progs = list(progs) if rolling else []
+            progs = [p for p in progs if p not in rolling_progs]
+            results = []
+            if progs:
+                self.stop_programs(progs)
+                time.sleep(1)
+                results = self.start_programs(progs)
+                for prog in progs:
+                    self.log_info("Restarted", prog)
+            for prog in rolling_progs:
+                results.extend(self.rolling_restart_program(prog, batch))
+            return results
+
+        def restart_program(self, prog):
+            return self.restart_programs([prog])
+
+        def program_status(self, prog):
+            state = self.programs[prog]
+            instances = []
+            for index in sorted(state.instances):
+                inst = state.instances[index]
+                instances.append({
+                    "index": inst.index,
+                    "pid": inst.pid,
+                    "state": inst.state,
+                    "alive": inst.state in ALIVE_STATES,
+                    "retries": inst.retries,
+                    "start_time": inst.start_time,
+                    "health": inst.health,
+                })
+            return {
+                "name": prog,
+                "status": state.status,
+                "cmd": state.config.get("cmd"),
+                "numprocs": state.config.get("numprocs", 1),
+                "running": state.running,
+                "crashloop": state.crashloop,
+                "instances": instances,
+            }
+
+        def tail(self, prog, index=None, stream="stdout", lines=20):
+            state = self.programs[prog]
+            indexes = [index] if index is not None else sorted(set(state.instances) | set(
+                range(1, state.config.get("numprocs", 1) + 1)))
+            if state.config.get("console") == "pty":
+                return {f"{prog}:{i}": self.console.tail(prog, i, lines) for i in indexes}
+            return {f"{prog}:{i}": self.output.tail(prog, i, stream, lines) for i in indexes}
+
+        def console_target(self, prog, index=None):
+            state = self.programs.get(prog)
+            if state is None:
+                raise ValueError(f"program '{prog}' not found")
+            if state.config.get("console") != "pty":
+                raise ValueError(f"program '{prog}' has no console (set 'console: pty')")
+            if index is None:
+                live = sorted(i for i in state.instances if self.console.has(prog, i))
+                index = live[0] if live else 1
+            inst = state.instances.get(index)
+            if inst is None or not self.console.has(prog, index):
+                raise ValueError(f"instance '{prog}:{index}' is not running")
+            return {"program": prog, "index": index, "pid": inst.pid}
+
+        def events_data(self, prog, since=None, index=None, limit=None):
+            events = self.events.query(prog, since=since, index=index, limit=limit)
+            counts = {}
+            for event in events:
+                counts[event["e"]] = counts.get(event["e"], 0) + 1
+            return {"program": prog, "since": since, "count": len(events), "by_event": counts, "events": events}
+
+        def metrics_data(self, progs=None):
+            latest = self.metrics.latest
+            out = {}
+            for info in self.status_data(progs):
+                prog = info["name"]
+                out[prog] = {
+                    str(i["index"]): {
+                        "pid": i["pid"],
+                        "state": i["state"],
+                        "latest": latest.get(i["pid"]) if i["alive"] else None,
+                        "history": self.metrics.history_for(prog, i["index"]),
+                    }
+                    for i in info["instances"]
+                }
+            return out
+
+        def status_data(self, progs=None, metrics=False):
+            snapshot = self.snapshot
+            if progs is None:
+                items = list(snapshot.values())
+            else:
+                items = [snapshot[prog] for prog in progs if prog in snapshot]
+            if not metrics:
+                return items
+            latest = self.metrics.latest
+            return [
+                dict(item, instances=[
+                    dict(i, metrics=latest.get(i["pid"]) if i["alive"] else None)
+                    for i in item["instances"]
+                ])
+                for item in items
+            ]
+
+        def start_control_server(self, path=None):
+            path = path or self.settings.get("socket")
+            if not path:
+                return None
+            self.control_server = ControlServer(self, path)
+            self.control_server.start()
+            return self.control_server
+
+        def _instance_fds(self, item):
+            fds = 1 if self.reaper.use_pidfd else 0
+            if item.get("console") == "pty":
+                return fds + 1
+            return fds + (2 if item.get("capture", True) else 0)
+
+        def _log_fd_budget(self, programs):
+            instances = sum(item.get("numprocs", 1) for item in programs.values())
+            needed = sum(item.get("numprocs", 1) * self._instance_fds(item) for item in programs.values())
+            available = self.fd_limit - len(os.listdir("/proc/self/fd")) - FD_RESERVE
+            budget = available // max(1, self._instance_fds(self.defaults))
+            self.log_info(f"Open file limit {self.fd_limit}: about {budget} instances "
+                          f"({instances} configured, {needed} fds needed)")
+            if needed > available:
+                self.log_info(f"Not enough file descriptors for {instances} instances, "
+                              f"raise the hard RLIMIT_NOFILE above {self.fd_limit}")
+
+        def _write_ready_file(self, path):
+            tmp = f"{path}.tmp"
+            with open(tmp, "w") as handle:
+                handle.write(f"{os.getpid()}\n")
+            os.replace(tmp, path)
+
+        def _remove_ready_file(self):
+            if self.ready_file:
+                try:
+                    os.unlink(self.ready_file)
+                except OSError:
+                    pass
 
-        def Run(self, programs=None):
+        def Run(self, programs=None, banner=True):
+            show = programs is None and banner
             if programs is None:
                 programs = self.configdata
+            if show:
                 print()
                 print(f"{CYAN}{'═'*60}{RESET}")
                 print(f"{CYAN}  ▶ TASKMASTER - Starting Programs{RESET}")
@@ -403,80 +3580,146 @@ class TaskMaster:
                 print(f"  {'─'*50}")
                 time.sleep(0.3)
 
-            for prog, item in programs.items():
-                if programs == self.configdata:
-                    runtime_item = self.programs.get(prog, item)
-                    runtime_item["status"] = "CREATED"
+            if self.journal.fd is None:
+                self.open_journal()
+            self._log_fd_budget(programs)
+            self.start_programs([prog for prog, item in programs.items() if item.get("autostart")])
+
+            if show:
+                for prog in programs:
                     print(f"  {prog:<15} {YELLOW}◌ Loading...{RESET}", end='\r')
                     time.sleep(0.4)
-
-                if item.get("autostart"):
-                    self.start_program(prog)
-
-                if programs == self.configdata:
-                    runtime_item = self.programs.get(prog, item)
-                    status = runtime_item.get("status")
-                    procs = runtime_item.get("procs", [])
-                    running = [p for p in procs if p.get("proc") and p["proc"].poll() is None]
-                    pid_list = ",".join(str(p["proc"].pid) for p in running) if running else "-"
-                    if status == "STARTED":
+                    info = self.snapshot.get(prog)
+                    status = info["status"] if info else ProgramStatus.CREATED
+                    running = [i for i in info["instances"] if i["alive"]] if info else []
+                    pid_list = ",".join(str(i["pid"]) for i in running) if running else "-"
+                    if status == ProgramStatus.STARTED:
                         print(f"  {prog:<15} {GREEN}● Started{RESET}            {pid_list}")
                     else:
                         print(f"  {prog:<15} {YELLOW}◌ Loaded{RESET}             {pid_list}")
                         time.sleep(0.3)
-
-            if programs == self.configdata:
                 time.sleep(0.3)
                 print(f"  {'─'*50}")
                 time.sleep(0.2)
                 print(f"  {GREEN}✓ {len(self.programs)} program(s) loaded {RESET}")
                 print()
 
+            self.metrics.start()
+            self.ready.set()
+            if self.ready_file:
+                self._write_ready_file(self.ready_file)
             return self.programs
         
-        def Load_config(self, state=None):
-                with open(self.configfile, 'r') as file:
-                    data = yaml.safe_load(file)
-                programs = data.get('programs', {})
+        def _apply_settings(self, settings):
+            self.settings = dict(self.settings_defaults)
+            self.settings.update(settings or {})
+            self.logger.configure(
+                max_bytes=self.settings.get("log_max_bytes"),
+                backups=self.settings.get("log_backups"),
+            )
+            self.metrics.configure(
+                interval=self.settings.get("metrics_interval"),
+                history=self.settings.get("metrics_history"),
+            )
+            self.health.concurrency = int(self.settings.get("probe_concurrency") or PROBE_CONCURRENCY)
+            self.events.max_bytes = int(self.settings.get("events_segment_bytes") or 0)
+            self.events.retention_days = float(self.settings.get("events_retention_days") or 0)
+            self.alerts.configure(self.settings.get("alerts"))
+
+        def _read_config(self):
+            st = os.stat(self.configfile)
+            stamp = (st.st_mtime_ns, st.st_size, st.st_ino)
+            if stamp == self.config_stamp and self.config_cache is not None:
+                return self.config_cache
+            with open(self.configfile, 'rb') as file:
+                raw = file.read()
+            digest = hashlib.sha1(raw).hexdigest()
+            if digest != self.config_digest or self.config_cache is None:
+                try:
+                    data = yaml.load(raw, Loader=YAML_LOADER) or {}
+                except yaml.YAMLError as e:
+                    raise ConfigError(f"{self.configfile}: {e}") from e
+                if not isinstance(data, dict):
+                    raise ConfigError(f"{self.configfile}: expected a mapping at the top level")
+                programs = data.get('programs') or {}
                 normalized = {}
                 for prog, item in programs.items():
-                    normalized[prog] = self._normalize_program_config(prog, item)
+                    try:
+                        normalized[prog] = self._normalize_program_config(prog, item)
+                    except (TypeError, ValueError) as e:
+                        raise ConfigError(f"program '{prog}': {e}") from e
+                self.config_cache = (data.get('taskmaster'), normalized)
+                self.config_digest = digest
+            self.config_stamp = stamp
+            return self.config_cache
+
+        def Load_config(self, state=None):
+                settings, normalized = self._read_config()
+                self._apply_settings(settings)
                 if state == "reload":
                     return normalized
                 else:
                     self.configdata = normalized
-                    self.programs = {prog: dict(item) for prog, item in normalized.items()}
+                    self.programs = {prog: ProgramState(prog, item) for prog, item in normalized.items()}
+                    for prog in self.programs:
+                        self._publish(prog)
 
         def reload_config(self):
             changed = False
-            new_conf = self.Load_config("reload")
+            settings = self.settings
+            try:
+                new_conf = self.Load_config("reload")
+            except (OSError, ValueError):
+                self._apply_settings(settings)
+                raise
+            self.reload_summary = {}
 
             for prog_new, items_new in new_conf.items():
-                if prog_new not in self.programs:
-                    items_new["status"] = "CREATED"
-                    items_new["procs"] = []
-                    self.programs[prog_new] = items_new
-                    if items_new.get("autostart"):
-                        self.start_program(prog_new)
-                    changed = True
-                else:
-                    current = self.programs[prog_new]
-                    if self._config_signature(items_new) != self._config_signature(current):
-                        self.stop_program(prog_new)
-                        items_new["status"] = "CREATED"
-                        items_new["procs"] = []
-                        self.programs[prog_new] = items_new
+                with self._locked([prog_new]):
+                    if prog_new not in self.programs:
+                        self.programs[prog_new] = ProgramState(prog_new, items_new)
+                        self._publish(prog_new)
                         if items_new.get("autostart"):
                             self.start_program(prog_new)
+                        self.reload_summary[prog_new] = "added"
                         changed = True
                     else:
-                        self.programs[prog_new].update(items_new)
+                        current = self.programs[prog_new]
+                        restart_fields, live_fields = self._diff_config(current.config, items_new)
+                        if restart_fields and current.instances and items_new.get("restart_strategy") == "rolling":
+                            self._apply_live_changes(current, items_new, spawn=False)
+                            results = self.rolling_restart_program(prog_new)
+                            self._spawn_instances(self._missing_instances(current))
+                            failed = any(r["error"] for r in results)
+                            self.reload_summary[prog_new] = "roll failed" if failed else "rolled"
+                            changed = True
+                        elif restart_fields:
+                            self.stop_program(prog_new)
+                            current.config = items_new
+                            self._publish(prog_new)
+                            if items_new.get("autostart"):
+                                self.start_program(prog_new)
+                            self.reload_summary[prog_new] = "restarted"
+                            changed = True
+                        elif live_fields:
+                            self._apply_live_changes(current, items_new)
+                            self.reload_summary[prog_new] = "updated"
+                            changed = True
+                        else:
+                            current.config = items_new
 
            
             for prog in list(self.programs.keys()):
                 if prog not in new_conf:
-                    self.stop_program(prog)
-                    self.programs.pop(prog)
+                    with self._locked([prog]):
+                        self.stop_program(prog)
+                        self.programs.pop(prog)
+                        self._publish(prog)
+                        self.output.forget(prog)
+                        self.console.forget(prog)
+                        self.metrics.forget(prog)
+                        self.sockets.forget(prog)
+                    self.reload_summary[prog] = "removed"
                     changed = True
 
             self.log_info("Configuration Reloaded")
@@ -484,88 +3727,171 @@ class TaskMaster:
 
         def request_reload(self, signum, frame):
             self.reload_requested = True
+            self.wakeup.set()
 
         def request_shutdown(self, signum, frame):
             self.shutdown_requested = True
+            self.wakeup.set()
+
+        def wait_for_signals(self):
+            while True:
+                self.wakeup.wait()
+                self.wakeup.clear()
+                if self.reload_requested:
+                    self.reload_requested = False
+                    try:
+                        self.reload_config()
+                    except Exception as e:
+                        self.log_info(f"Configuration reload failed ({e})")
+                if self.shutdown_requested:
+                    self.shutdown()
+                    break
 
         def shutdown(self):
             self.shutdown_requested = True
-            for prog in list(self.programs.keys()):
-                self.stop_program(prog)
+            detached = set()
+            if self.keep_children or self.settings.get("keep_children"):
+                detached = self.detach_children()
+            self.stop_programs([prog for prog in self.programs if prog not in detached])
             self.log_info("Stopped")
+            self.metrics.stop()
+            self.health.stop()
+            self.sockets.close()
+            self.output.close()
+            self.console.close()
+            if self.control_server is not None:
+                self.control_server.stop()
+            self.journal.close()
+            self.alerts.close()
+            self.events.close()
+            self.logger.close()
+            self._remove_ready_file()
                 
       
-        def Monitor(self):
-            while True:
-                for prog in list(self.programs.keys()):
-                    item = self.programs[prog]
-                    procs = list(item.get("procs", []))
+        def _handle_exit(self, inst):
+            prog = inst.program
+            state = self.programs.get(prog)
+            if state is None or not state.owns(inst):
+                return
+            item = state.config
+            proc = inst.proc
+            ret = proc.poll()
+            if ret is None:
+                self.reaper.watch(proc, inst)
+                return
+            if inst.state == InstanceStatus.STOPPING:
+                self._finish_async_stop(state, inst)
+                return
 
-                    for proc_info in list(procs):
-                        proc = proc_info.get("proc")
-                        if proc is None:
-                            continue
-                        ret = proc.poll()
-                        if ret is None:
-                            continue
+            state.transition(inst, InstanceStatus.EXITED)
+            run_time = time.time() - inst.start_time
+            expected = ret in item.get("exitcodes", [0])
+            autorestart = item.get("autorestart")
 
-                        run_time = time.time() - proc_info.get("start_time", time.time())
-                        expected = ret in item.get("exitcodes", [0])
-                        autorestart = item.get("autorestart")
-
-                        should_restart = False
-                        if autorestart is True:
-                            should_restart = True
-                        elif isinstance(autorestart, str) and autorestart.lower() == "unexpected":
-                            should_restart = not expected
-
-                        if run_time < item.get("starttime", 0):
-                            proc_info["retries"] += 1
-                            if proc_info["retries"] <= item.get("startretries", 0):
-                                should_restart = True
-                            else:
-                                should_restart = False
-                                self.log_info("Failed", prog, proc.pid, instance=proc_info.get("index"))
-                        elif should_restart and item.get("startretries", 0) > 0:
-                            proc_info["retries"] += 1
-                            if proc_info["retries"] > item.get("startretries", 0):
-                                should_restart = False
-                                self.log_info("Failed", prog, proc.pid, instance=proc_info.get("index"))
-
-                        self._close_output_handles(proc_info)
-
-                        if should_restart:
-                            self.log_info("Restarting", prog, proc.pid, instance=proc_info.get("index"))
-                            new_proc_info = self._start_process(prog, item, proc_info.get("index", 1))
-                            new_proc_info["retries"] = proc_info.get("retries", 0)
-                            procs[procs.index(proc_info)] = new_proc_info
-                            self.log_info("Started", prog, new_proc_info["proc"].pid, instance=new_proc_info.get("index"))
-                        else:
-                            self.log_info("Stopped", prog, proc.pid, instance=proc_info.get("index"))
-                            procs.remove(proc_info)
+            should_restart = False
+            if autorestart is True:
+                should_restart = True
+            elif isinstance(autorestart, str) and autorestart.lower() == "unexpected":
+                should_restart = not expected
+            if inst.limit is not None:
+                should_restart = True
+
+            if run_time < item.get("starttime", 0):
+                inst.retries += 1
+                if inst.retries <= item.get("startretries", 0):
+                    should_restart = True
+                else:
+                    should_restart = False
+                    state.transition(inst, InstanceStatus.FATAL)
+                    self.log_info("Failed", prog, proc.pid, instance=inst.index)
+            elif should_restart and item.get("startretries", 0) > 0:
+                inst.retries += 1
+                if inst.retries > item.get("startretries", 0):
+                    should_restart = False
+                    state.transition(inst, InstanceStatus.FATAL)
+                    self.log_info("Failed", prog, proc.pid, instance=inst.index)
 
-                    item["procs"] = procs
-                    self._update_program_status(item)
+            self._close_output_handles(inst)
+            if should_restart or not expected:
+                self._record_exit(state)
+
+            if should_restart:
+                delay = self._restart_delay(state, inst)
+                inst.restarts += 1
+                state.transition(inst, InstanceStatus.BACKOFF)
+                self.log_info("Restarting", prog, proc.pid, instance=inst.index)
+                self.timers.call_later(delay, self._locked_timer, prog, self._restart_instance, state, inst)
+            else:
+                self.log_info("Stopped", prog, proc.pid, instance=inst.index)
+                state.remove(inst)
+
+            self._update_program_status(state)
+
+        def Monitor(self):
+            deferred = []
+            while True:
+                timeout = self.timers.next_timeout()
+                if deferred:
+                    timeout = 0.05 if timeout is None else min(timeout, 0.05)
+                pending = deferred + self.reaper.wait(timeout)
+                deferred = []
+                for inst in pending:
+                    lock = self._program_lock(inst.program)
+                    if not lock.acquire(blocking=False):
+                        deferred.append(inst)
+                        continue
+                    try:
+                        self._handle_exit(inst)
+                    finally:
+                        lock.release()
+                self.timers.run_due()
 
-                time.sleep(5)
-                
 if __name__ == "__main__":
-    
+
+    parser = argparse.ArgumentParser(description="TaskMaster process supervisor")
+    parser.add_argument("-c", "--config", default=CONFILE, help="configuration file")
+    parser.add_argument("--headless", action="store_true",
+                        help="no banner and no control shell, supervise until SIGTERM/SIGINT")
+    parser.add_argument("--ready-file", help="file written with the supervisor PID once autostart is done")
+    parser.add_argument("-s", "--socket", help="control socket path (default from config or /tmp/taskmaster.sock)")
+    parser.add_argument("--adopt", action="store_true",
+                        help="reattach to children recorded in the state file instead of respawning them")
+    parser.add_argument("--keep-children", action="store_true",
+                        help="leave children running when taskmaster exits (programs with capture: false)")
+    args = parser.parse_args()
+
     with open(LOGFILE, 'w') as logfile:
                 logfile.write("")
-    Obj = TaskMaster(CONFILE)
-    Obj.Load_config()
+    Obj = TaskMaster(args.config)
+    Obj.ready_file = args.ready_file
+    Obj.keep_children = args.keep_children
+    try:
+        Obj.Load_config()
+    except (OSError, ConfigError) as e:
+        print(f"{RED}Error: invalid configuration: {e}{RESET}", file=sys.stderr)
+        sys.exit(1)
 
     signal.signal(signal.SIGHUP, Obj.request_reload)
     signal.signal(signal.SIGTERM, Obj.request_shutdown)
     signal.signal(signal.SIGINT, Obj.request_shutdown)
+    if not Obj.reaper.use_pidfd:
+        signal.signal(signal.SIGCHLD, Obj.reaper.on_sigchld)
 
-    Obj.Run()
-    
     Thread_Monitor = threading.Thread(target=Obj.Monitor)
     Thread_Monitor.daemon = True
     Thread_Monitor.start()
-    
-    Ctl = ControlShell(Obj)
-    Ctl.command_input()
-    
\ No newline at end of file
+
+    try:
+        Obj.start_control_server(args.socket)
+    except OSError as e:
+        print(f"{RED}Error: control socket unavailable: {e}{RESET}", file=sys.stderr)
+        sys.exit(1)
+    Obj.open_journal(adopt=args.adopt or None)
+
+    Obj.Run(banner=not args.headless)
+
+    if args.headless:
+        Obj.wait_for_signals()
+    else:
+        Ctl = ControlShell(Obj)
+        Ctl.command_input()
@@ -0,0 +1,105 @@
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+import subprocess
+
+ARGV = ["/bin/true"]
+UMASK = 0o022
+
+
+def apply_umask():
+    os.umask(UMASK)
+
+
+def spawn_preexec():
+    return subprocess.Popen(ARGV, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                            cwd="/tmp", preexec_fn=apply_umask)
+
+
+def spawn_umask():
+    return subprocess.Popen(ARGV, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                            cwd="/tmp", umask=UMASK)
+
+
+def spawn_posix_spawn():
+    return os.posix_spawn(ARGV[0], ARGV, os.environ)
+
+
+BACKENDS = {
+    "preexec_fn": spawn_preexec,
+    "umask": spawn_umask,
+    "posix_spawn": spawn_posix_spawn,
+}
+
+
+def reap(child):
+    if isinstance(child, int):
+        os.waitpid(child, 0)
+    else:
+        child.wait()
+
+
+def grow_rss(megabytes):
+    block = bytearray(megabytes * 1024 * 1024)
+    for offset in range(0, len(block), 4096):
+        block[offset] = 1
+    return block
+
+
+def rss_bytes():
+    with open("/proc/self/statm") as handle:
+        return int(handle.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+def busy(stop):
+    while not stop.is_set():
+        sum(range(1000))
+        time.sleep(0.001)
+
+
+def measure(spawn, count):
+    start = time.perf_counter()
+    children = [spawn() for _ in range(count)]
+    spawned = time.perf_counter() - start
+    for child in children:
+        reap(child)
+    return count / spawned if spawned else float("inf")
+
+
+def run(rss_mb, count, backends):
+    block = grow_rss(rss_mb)
+    stop = threading.Event()
+    thread = threading.Thread(target=busy, args=(stop,), daemon=True)
+    thread.start()
+    try:
+        rates = {name: measure(BACKENDS[name], count) for name in backends}
+    finally:
+        stop.set()
+        thread.join()
+    result = {"rss_mb": rss_mb, "rss_bytes": rss_bytes(), "spawns": count, "spawns_per_sec": rates}
+    del block
+    return result
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Compare process spawn backends under a large supervisor RSS")
+    parser.add_argument("--rss-mb", type=int, nargs="+", default=[50, 1024])
+    parser.add_argument("--count", type=int, default=200)
+    parser.add_argument("--backends", nargs="+", choices=sorted(BACKENDS), default=list(BACKENDS))
+    parser.add_argument("-o", "--output", help="write the JSON report to this file")
+    args = parser.parse_args()
+
+    report = {"benchmark": "spawn", "python": sys.version.split()[0], "results": []}
+    for rss_mb in args.rss_mb:
+        result = run(rss_mb, args.count, args.backends)
+        report["results"].append(result)
+        rates = "  ".join(f"{name}={rate:.0f}/s" for name, rate in result["spawns_per_sec"].items())
+        print(f"{result['rss_bytes'] / 1024 / 1024:>7.0f} MiB RSS  {rates}")
+
+    if args.output:
+        with open(args.output, "w") as handle:
+            json.dump(report, handle, indent=2)
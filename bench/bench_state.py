@@ -0,0 +1,180 @@
+import os
+import sys
+import json
+import time
+import argparse
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from TaskMaster import ProgramState, InstanceState, InstanceStatus
+
+
+class FakeProc:
+
+        __slots__ = ("pid", "returncode")
+
+        def __init__(self, pid):
+            self.pid = pid
+            self.returncode = None
+
+        def poll(self):
+            return self.returncode
+
+
+CONFIG = {
+    "cmd": "python3 -c 'import time; time.sleep(99999)'",
+    "numprocs": 1,
+    "autostart": True,
+    "autorestart": True,
+    "exitcodes": [0],
+    "starttime": 1,
+    "startretries": 3,
+    "stopsignal": "TERM",
+    "stoptime": 10,
+    "stdout": None,
+    "stderr": None,
+    "env": {},
+    "workingdir": None,
+    "umask": None,
+    "priority": 999,
+}
+
+
+def build_dicts(programs, numprocs):
+    table = {}
+    pid = 1
+    for p in range(programs):
+        item = dict(CONFIG)
+        item["numprocs"] = numprocs
+        item["status"] = "STARTED"
+        item["procs"] = []
+        for index in range(1, numprocs + 1):
+            item["procs"].append({
+                "proc": FakeProc(pid),
+                "start_time": time.time(),
+                "retries": 0,
+                "stdout_handle": None,
+                "stderr_handle": None,
+                "index": index,
+            })
+            pid += 1
+        table[f"prog{p}"] = item
+    return table
+
+
+def build_slots(programs, numprocs):
+    table = {}
+    pid = 1
+    for p in range(programs):
+        state = ProgramState(f"prog{p}", dict(CONFIG, numprocs=numprocs))
+        for index in range(1, numprocs + 1):
+            state.add(InstanceState(state.name, index, FakeProc(pid)))
+            pid += 1
+        state.refresh_status()
+        table[state.name] = state
+    return table
+
+
+def dict_status(table):
+    total = 0
+    for item in table.values():
+        procs = item.get("procs", [])
+        running = [p for p in procs if p.get("proc") and p["proc"].poll() is None]
+        if running:
+            item["status"] = "STARTED"
+        elif procs:
+            item["status"] = "STOPPED"
+        else:
+            item["status"] = "CREATED"
+        total += len(running)
+    return total
+
+
+def slot_status(table):
+    total = 0
+    for state in table.values():
+        state.refresh_status()
+        total += state.running
+    return total
+
+
+def dict_transition(table):
+    for item in table.values():
+        procs = item["procs"]
+        proc_info = procs[len(procs) // 2]
+        new_info = dict(proc_info, proc=FakeProc(proc_info["proc"].pid))
+        procs[procs.index(proc_info)] = new_info
+        running = [p for p in procs if p.get("proc") and p["proc"].poll() is None]
+        item["status"] = "STARTED" if running else "STOPPED"
+
+
+def slot_transition(table):
+    for state in table.values():
+        inst = state.instances[len(state.instances) // 2 + 1]
+        state.transition(inst, InstanceStatus.EXITED)
+        state.add(InstanceState(state.name, inst.index, FakeProc(inst.pid)))
+        state.refresh_status()
+
+
+def measure_memory(builder, programs, numprocs):
+    tracemalloc.start()
+    table = builder(programs, numprocs)
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return current, table
+
+
+def measure_rate(func, table, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        func(table)
+    elapsed = time.perf_counter() - start
+    return rounds / elapsed if elapsed else float("inf")
+
+
+def run(programs, numprocs, rounds):
+    instances = programs * numprocs
+    dict_mem, dict_table = measure_memory(build_dicts, programs, numprocs)
+    slot_mem, slot_table = measure_memory(build_slots, programs, numprocs)
+    return {
+        "programs": programs,
+        "numprocs": numprocs,
+        "instances": instances,
+        "memory_bytes": {"dict": dict_mem, "slots": slot_mem},
+        "memory_per_instance": {"dict": dict_mem / instances, "slots": slot_mem / instances},
+        "status_per_sec": {
+            "dict": measure_rate(dict_status, dict_table, rounds),
+            "slots": measure_rate(slot_status, slot_table, rounds),
+        },
+        "transitions_per_sec": {
+            "dict": measure_rate(dict_transition, dict_table, rounds) * programs,
+            "slots": measure_rate(slot_transition, slot_table, rounds) * programs,
+        },
+    }
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Compare dict and slotted runtime records")
+    parser.add_argument("--programs", type=int, nargs="+", default=[100, 1000])
+    parser.add_argument("--numprocs", type=int, default=10)
+    parser.add_argument("--rounds", type=int, default=20)
+    parser.add_argument("-o", "--output", help="write the JSON report to this file")
+    args = parser.parse_args()
+
+    report = {"benchmark": "state_records", "results": []}
+    for programs in args.programs:
+        result = run(programs, args.numprocs, args.rounds)
+        report["results"].append(result)
+        print(f"{result['instances']:>7} instances  "
+              f"mem/inst dict={result['memory_per_instance']['dict']:.0f}B "
+              f"slots={result['memory_per_instance']['slots']:.0f}B  "
+              f"status/s dict={result['status_per_sec']['dict']:.1f} "
+              f"slots={result['status_per_sec']['slots']:.1f}  "
+              f"transitions/s dict={result['transitions_per_sec']['dict']:.0f} "
+              f"slots={result['transitions_per_sec']['slots']:.0f}")
+
+    if args.output:
+        with open(args.output, "w") as handle:
+            json.dump(report, handle, indent=2)
@@ -0,0 +1,271 @@
+import io
+import os
+import sys
+import json
+import time
+import yaml
+import signal
+import random
+import shutil
+import argparse
+import resource
+import tempfile
+import threading
+import contextlib
+import subprocess
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+from TaskMaster import TaskMaster, ControlShell, InstanceStatus
+
+
+def generate_config(path, programs, numprocs, capture=False, variant=0, changed=0):
+    config = {
+        "taskmaster": {
+            "socket": None,
+            "state_file": None,
+            "events_dir": None,
+            "metrics_interval": 0,
+            "spawn_parallelism": 16,
+        },
+        "programs": {},
+    }
+    for p in range(programs):
+        version = variant if p < changed else 0
+        config["programs"][f"prog{p:05d}"] = {
+            "cmd": f"sleep {100000 + version}",
+            "numprocs": numprocs,
+            "autostart": True,
+            "autorestart": True,
+            "starttime": 0,
+            "stoptime": 5,
+            "backoff_base": 0,
+            "backoff_jitter": 0,
+            "crashloop_threshold": 1000000,
+            "capture": capture,
+            "env": {"BENCH_PROGRAM": str(p)},
+        }
+    with open(path, "w") as handle:
+        yaml.safe_dump(config, handle, default_flow_style=False)
+    return config
+
+
+def rss_bytes():
+    with open("/proc/self/statm") as handle:
+        return int(handle.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+def cpu_seconds():
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def summarize(values):
+    return {
+        "count": len(values),
+        "p50": percentile(values, 0.5),
+        "p95": percentile(values, 0.95),
+        "max": max(values) if values else None,
+    }
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - start, result
+
+
+def cold_start(configfile):
+    tm = TaskMaster(configfile)
+    monitor = threading.Thread(target=tm.Monitor, daemon=True)
+    start = time.perf_counter()
+    tm.Load_config()
+    monitor.start()
+    tm.Run(banner=False)
+    elapsed = time.perf_counter() - start
+    return tm, elapsed
+
+
+def steady_state(tm, seconds):
+    cpu = cpu_seconds()
+    start = time.perf_counter()
+    time.sleep(seconds)
+    wall = time.perf_counter() - start
+    return {
+        "seconds": round(wall, 3),
+        "cpu_percent": round(100 * (cpu_seconds() - cpu) / wall, 3),
+        "rss_bytes": rss_bytes(),
+        "threads": threading.active_count(),
+    }
+
+
+def status_cost(tm, rounds):
+    shell = ControlShell(tm)
+    data = []
+    rendered = []
+    for _ in range(rounds):
+        data.append(timed(tm.status_data)[0])
+        with contextlib.redirect_stdout(io.StringIO()):
+            rendered.append(timed(shell.cmd_status)[0])
+    return {"status_data": summarize(data), "render": summarize(rendered)}
+
+
+def wait_replaced(state, index, old, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        inst = state.instances.get(index)
+        if inst is not None and inst is not old and inst.state in (InstanceStatus.STARTING, InstanceStatus.RUNNING):
+            return True
+        time.sleep(0.0005)
+    return False
+
+
+def restart_latency(tm, samples, timeout=10):
+    targets = [(state, inst) for state in tm.programs.values() for inst in state.instances.values()]
+    random.Random(0).shuffle(targets)
+    latencies = []
+    missed = 0
+    for state, inst in targets[:samples]:
+        start = time.perf_counter()
+        os.kill(inst.pid, signal.SIGKILL)
+        if wait_replaced(state, inst.index, inst, timeout):
+            latencies.append(time.perf_counter() - start)
+        else:
+            missed += 1
+    result = summarize(latencies)
+    result["missed"] = missed
+    return result
+
+
+def reload_cost(tm, configfile, programs, numprocs, capture, fractions):
+    results = []
+    for variant, fraction in enumerate(fractions, start=1):
+        changed = int(programs * fraction)
+        generate_config(configfile, programs, numprocs, capture, variant, changed)
+        elapsed, did_change = timed(tm.reload_config)
+        results.append({"changed_programs": changed, "fraction": fraction,
+                        "seconds": elapsed, "changed": did_change})
+    return results
+
+
+def stop_cost(tm):
+    prog = next(iter(tm.programs))
+    stop, _ = timed(tm.stop_program, prog)
+    start, _ = timed(tm.start_program, prog)
+    return {"stop_program": stop, "start_program": start}
+
+
+def key_metrics(result):
+    metrics = {
+        "cold_start_seconds": result["cold_start_seconds"],
+        "restart_p50": result["restart_latency"]["p50"],
+        "restart_p95": result["restart_latency"]["p95"],
+        "status_render_p50": result["status"]["render"]["p50"],
+        "stop_program": result["stop"]["stop_program"],
+        "shutdown_seconds": result["shutdown_seconds"],
+        "idle_cpu_percent": result["steady_state"]["cpu_percent"],
+        "rss_bytes": result["steady_state"]["rss_bytes"],
+    }
+    for entry in result["reload"]:
+        metrics[f"reload_{entry['fraction']:g}"] = entry["seconds"]
+    return metrics
+
+
+def compare(baseline, report):
+    old = {r["instances"]: key_metrics(r) for r in baseline["results"]}
+    for result in report["results"]:
+        before = old.get(result["instances"])
+        if before is None:
+            continue
+        print(f"{result['instances']} instances: {baseline.get('commit')} -> {report.get('commit')}")
+        for name, value in key_metrics(result).items():
+            previous = before.get(name)
+            if previous is None or value is None:
+                continue
+            change = f"{(value - previous) / previous:+.1%}" if previous else "n/a"
+            print(f"  {name:<22} {previous:>14.6g} {value:>14.6g}  {change}")
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(programs, numprocs, capture, steady, status_rounds, restart_samples, fractions):
+    workdir = tempfile.mkdtemp(prefix="taskmaster-bench-")
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        configfile = os.path.join(workdir, "conf.yaml")
+        generate_config(configfile, programs, numprocs, capture)
+        tm, start_seconds = cold_start(configfile)
+        result = {
+            "programs": programs,
+            "numprocs": numprocs,
+            "instances": programs * numprocs,
+            "capture": capture,
+            "cold_start_seconds": start_seconds,
+            "running_after_start": sum(state.running for state in tm.programs.values()),
+        }
+        result["steady_state"] = steady_state(tm, steady)
+        result["status"] = status_cost(tm, status_rounds)
+        result["restart_latency"] = restart_latency(tm, restart_samples)
+        result["stop"] = stop_cost(tm)
+        result["reload"] = reload_cost(tm, configfile, programs, numprocs, capture, fractions)
+        result["shutdown_seconds"], _ = timed(tm.shutdown)
+        return result
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Load-test TaskMaster hot paths with synthetic configurations")
+    parser.add_argument("--programs", type=int, nargs="+", default=[100, 1000])
+    parser.add_argument("--numprocs", type=int, default=1)
+    parser.add_argument("--capture", action="store_true", help="capture output through pipes")
+    parser.add_argument("--steady", type=float, default=5, help="seconds of idle supervision to sample CPU/RSS")
+    parser.add_argument("--status-rounds", type=int, default=20)
+    parser.add_argument("--restart-samples", type=int, default=50)
+    parser.add_argument("--reload-fractions", type=float, nargs="+", default=[0.0, 0.01, 0.1],
+                        help="fractions of programs whose cmd changes between reloads")
+    parser.add_argument("-o", "--output", help="write the JSON report to this file")
+    parser.add_argument("--compare", metavar="REPORT", help="print the change against an earlier JSON report")
+    args = parser.parse_args()
+
+    report = {"benchmark": "supervisor", "commit": git_commit(), "python": sys.version.split()[0],
+              "results": []}
+    for programs in args.programs:
+        result = run(programs, args.numprocs, args.capture, args.steady, args.status_rounds,
+                     args.restart_samples, args.reload_fractions)
+        report["results"].append(result)
+        reloads = " ".join(f"{r['fraction']:.0%}={r['seconds'] * 1000:.0f}ms" for r in result["reload"])
+        print(f"{result['instances']:>6} instances  "
+              f"start={result['cold_start_seconds']:.2f}s  "
+              f"restart p50={result['restart_latency']['p50'] * 1000:.1f}ms "
+              f"p95={result['restart_latency']['p95'] * 1000:.1f}ms  "
+              f"status={result['status']['render']['p50'] * 1000:.1f}ms  "
+              f"reload {reloads}  "
+              f"shutdown={result['shutdown_seconds']:.2f}s  "
+              f"idle cpu={result['steady_state']['cpu_percent']:.1f}% "
+              f"rss={result['steady_state']['rss_bytes'] / 1024 / 1024:.0f}MiB")
+
+    if args.output:
+        with open(args.output, "w") as handle:
+            json.dump(report, handle, indent=2)
+
+    if args.compare:
+        with open(args.compare) as handle:
+            compare(json.load(handle), report)
@@ -0,0 +1,399 @@
+import socket
+import json
+import sys
+import os
+import tty
+import select
+import termios
+import shlex
+import argparse
+import readline
+from datetime import datetime
+
+SOCKFILE = "/tmp/taskmaster.sock"
+GREEN = "\033[92m"
+RED = "\033[91m"
+YELLOW = "\033[93m"
+CYAN = "\033[96m"
+RESET = "\033[0m"
+
+PROGRAM_COMMANDS = ("start", "stop", "restart")
+CONSOLE_ESCAPE = b"\x1d"
+
+
+class ControlClient:
+
+        def __init__(self, path):
+            self.path = path
+            self.sock = None
+            self.file = None
+            self.next_id = 0
+
+        def connect(self):
+            self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.sock.connect(self.path)
+            self.file = self.sock.makefile("rwb")
+
+        def close(self):
+            if self.file is not None:
+                self.file.close()
+            if self.sock is not None:
+                self.sock.close()
+            self.sock = None
+            self.file = None
+
+        def request(self, payload):
+            if self.sock is None:
+                self.connect()
+            self.next_id += 1
+            payload = dict(payload, id=self.next_id)
+            self.file.write(json.dumps(payload).encode() + b"\n")
+            self.file.flush()
+            line = self.file.readline()
+            if not line:
+                raise ConnectionError("connection closed by taskmaster")
+            return json.loads(line)
+
+        def call(self, cmd, **kwargs):
+            return self.request(dict(kwargs, cmd=cmd))
+
+        def batch(self, requests):
+            return self.request({"batch": list(requests)})
+
+        def attach(self, request):
+            if self.sock is None:
+                self.connect()
+            self.next_id += 1
+            self.sock.sendall(json.dumps(dict(request, id=self.next_id)).encode() + b"\n")
+            line = bytearray()
+            while not line.endswith(b"\n"):
+                chunk = self.sock.recv(1)
+                if not chunk:
+                    raise ConnectionError("connection closed by taskmaster")
+                line += chunk
+            response = json.loads(line)
+            if not response.get("ok"):
+                return response, None
+            sock = self.sock
+            self.file.close()
+            self.sock = None
+            self.file = None
+            return response, sock
+
+
+def format_event_data(data):
+    return " ".join(f"{key}={value}" for key, value in data.items())
+
+
+def is_count(value):
+    text = str(value).strip()
+    return (text[:-1] if text.endswith("%") else text).isdigit()
+
+
+def parse_command(line):
+    words = shlex.split(line)
+    if not words:
+        return None
+    cmd, args = words[0], words[1:]
+    if cmd == "rolling-restart" or (cmd == "restart" and "--rolling" in args):
+        request = {"cmd": "restart", "programs": [], "rolling": True}
+        rest = iter(a for a in args if a != "--rolling")
+        for arg in rest:
+            if arg == "--batch":
+                request["batch_size"] = next(rest, "")
+            elif arg.startswith("--batch="):
+                request["batch_size"] = arg.split("=", 1)[1]
+            else:
+                request["programs"].append(arg)
+        if cmd == "rolling-restart" and len(request["programs"]) > 1 and is_count(request["programs"][-1]):
+            request.setdefault("batch_size", request["programs"].pop())
+        if "batch_size" in request and not is_count(request["batch_size"]):
+            raise ValueError(f"invalid batch '{request['batch_size']}' (expected N or N%)")
+        return request
+    if cmd in PROGRAM_COMMANDS:
+        return {"cmd": cmd, "programs": args}
+    if cmd == "tail":
+        if not args:
+            raise ValueError("No program specified for 'tail' command.")
+        prog, _, index = args[0].partition(":")
+        request = {"cmd": cmd, "program": prog, "stream": "stdout", "lines": 20}
+        if index:
+            request["index"] = int(index)
+        for arg in args[1:]:
+            if arg in ("stdout", "stderr"):
+                request["stream"] = arg
+            else:
+                request["lines"] = int(arg)
+        return request
+    if cmd == "events":
+        if not args:
+            raise ValueError("No program specified for 'events' command.")
+        prog, _, index = args[0].partition(":")
+        request = {"cmd": cmd, "program": prog, "limit": 50}
+        if index:
+            request["index"] = int(index)
+        rest = iter(args[1:])
+        for arg in rest:
+            if arg == "--since":
+                request["since"] = next(rest, "")
+            elif arg.startswith("--since="):
+                request["since"] = arg.split("=", 1)[1]
+            elif arg == "--limit":
+                request["limit"] = int(next(rest, "0"))
+        return request
+    if cmd == "attach":
+        if not args:
+            raise ValueError("No program specified for 'attach' command.")
+        prog, _, index = args[0].partition(":")
+        request = {"cmd": cmd, "program": prog}
+        if index:
+            request["index"] = int(index)
+        if os.isatty(sys.stdout.fileno()):
+            size = os.get_terminal_size()
+            request["rows"], request["cols"] = size.lines, size.columns
+        return request
+    if cmd == "status" and args:
+        request = {"cmd": cmd, "programs": [a for a in args if a != "-v"]}
+        if "-v" in args:
+            request["metrics"] = True
+        if not request["programs"]:
+            del request["programs"]
+        return request
+    if cmd == "metrics" and args:
+        return {"cmd": cmd, "programs": args}
+    return {"cmd": cmd}
+
+
+def console_session(sock, escape=CONSOLE_ESCAPE):
+    stdin = sys.stdin.fileno()
+    stdout = sys.stdout.fileno()
+    saved = termios.tcgetattr(stdin) if os.isatty(stdin) else None
+    print(f"{CYAN}Attached. Press Ctrl-] to detach.{RESET}\r")
+    try:
+        if saved is not None:
+            tty.setraw(stdin)
+        while True:
+            readable, _, _ = select.select([stdin, sock], [], [])
+            if sock in readable:
+                data = sock.recv(65536)
+                if not data:
+                    break
+                os.write(stdout, data)
+            if stdin in readable:
+                data = os.read(stdin, 1024)
+                if not data or escape in data:
+                    if data:
+                        sock.sendall(data.split(escape, 1)[0])
+                    break
+                sock.sendall(data)
+    finally:
+        if saved is not None:
+            termios.tcsetattr(stdin, termios.TCSADRAIN, saved)
+        sock.close()
+    print(f"\r\n{CYAN}Detached.{RESET}")
+
+
+def format_bytes(value):
+    for unit in ("B", "K", "M", "G"):
+        if value < 1024 or unit == "G":
+            return f"{value:.0f}{unit}" if unit == "B" else f"{value:.1f}{unit}"
+        value /= 1024
+
+
+class ClientShell:
+
+        def __init__(self, client, as_json=False):
+            self.client = client
+            self.as_json = as_json
+
+        def cmd_help(self):
+            print("\nAvailable commands:")
+            print("  help                  - Show this help")
+            print("  status [-v] [program...]")
+            print("                        - Show program status (-v: per-instance CPU/RSS/fds/threads)")
+            print("  start <program...>    - Start programs ('all' for every program)")
+            print("  stop <program...>     - Stop programs")
+            print("  restart <program...>  - Restart programs (--rolling for batch-by-batch)")
+            print("  rolling-restart <program...> [batch]")
+            print("                        - Same as 'restart --rolling [--batch N|N%]'")
+            print("  tail <program>[:n] [stdout|stderr] [lines]")
+            print("                        - Show recent output")
+            print("  metrics [program...]  - Dump sampled resource metrics")
+            print("  events <program>[:n] [--since 1h|30m|<ISO time>] [--limit N]")
+            print("                        - Show recorded events")
+            print("  attach <program>[:n]  - Attach to a 'console: pty' instance (Ctrl-] detaches)")
+            print("  reload                - Reload configuration file")
+            print("  shutdown              - Stop taskmaster and all programs")
+            print("  quit                  - Exit this client")
+            print()
+
+        def render_status(self, programs):
+            print()
+            print(f"{'─'*60}")
+            print(f"  {'PROGRAM':<15} {'PID':<10} {'STATUS':<12} {'CMD'}")
+            print(f"{'─'*60}")
+            for item in programs:
+                pids = [str(i["pid"]) for i in item["instances"] if i["alive"]]
+                pid_list = ",".join(pids) if pids else "-"
+                if item["status"] == "STARTED":
+                    status_icon = f"{GREEN}● RUNNING{RESET}"
+                    print(f"  {item['name']:<15} {pid_list:<10} {status_icon:<21} {item['cmd']} ({item['running']}/{item['numprocs']})")
+                elif item["status"] == "BACKOFF":
+                    status_icon = f"{YELLOW}↻ BACKOFF{RESET}"
+                    print(f"  {item['name']:<15} {pid_list:<10} {status_icon:<21} {item['cmd']} ({item['running']}/{item['numprocs']})")
+                else:
+                    status_icon = f"{RED}▪ STOPPED{RESET}"
+                    print(f"  {item['name']:<15} {pid_list:<10} {status_icon:<21} {item['cmd']}")
+                if item.get("crashloop"):
+                    print(f"  {'':<15} {YELLOW}↻ crash loop: restarts delayed by backoff_max{RESET}")
+                for inst in item["instances"]:
+                    if "metrics" not in inst:
+                        continue
+                    sample = inst["metrics"]
+                    name = f"{item['name']}:{inst['index']}"
+                    health = f" ({inst['health']})" if inst.get("health") else ""
+                    if sample is None:
+                        print(f"    {name:<13} {inst['state']:<10}{health}")
+                        continue
+                    print(f"    {name:<13} {inst['state']:<10} cpu {sample['cpu']:>6.1f}%  "
+                          f"rss {format_bytes(sample['rss']):>7}  fds {sample['fds']:>4}  "
+                          f"threads {sample['threads']:>3}  up {sample['uptime']:.0f}s{health}")
+            print(f"{'─'*60}")
+            print(f"  Total: {len(programs)} program(s)")
+            print()
+
+        def render(self, request, response):
+            if self.as_json:
+                print(json.dumps(response, indent=2))
+                return
+            if not response.get("ok") and "error" in response:
+                print(f"{RED}Error: {response['error']}{RESET}")
+                return
+            cmd = request["cmd"]
+            result = response.get("result")
+            if cmd == "status":
+                self.render_status(result)
+            elif cmd in PROGRAM_COMMANDS:
+                for prog, entry in result.items():
+                    if entry["ok"]:
+                        print(f"{GREEN}Program '{prog}' {entry['result']} successfully.{RESET}")
+                    else:
+                        print(f"{RED}Program '{prog}': {entry.get('error', entry.get('result'))}{RESET}")
+                        for r in entry.get("instances", []):
+                            if r["error"]:
+                                print(f"{RED}  {prog}:{r['index']} - {r['error']}{RESET}")
+            elif cmd == "reload":
+                if result["changed"]:
+                    print(f"{GREEN}Configuration reloaded successfully.{RESET}")
+                    for prog, action in result.get("programs", {}).items():
+                        print(f"  {prog:<15} {action}")
+                else:
+                    print(f"{GREEN}Configuration reloaded, Nothing Changed!{RESET}")
+            elif cmd == "tail":
+                for name, text in result.items():
+                    print(f"{CYAN}==> {name} ({request['stream']}) <=={RESET}")
+                    if text:
+                        print(text)
+            elif cmd == "events":
+                for event in result["events"]:
+                    stamp = datetime.fromtimestamp(event["t"]).strftime("%Y-%m-%d %H:%M:%S")
+                    name = f"{event['p']}:{event['i']}" if "i" in event else event["p"]
+                    pid = f" [PID:{event['pid']}]" if "pid" in event else ""
+                    data = f" {format_event_data(event['d'])}" if event.get("d") else ""
+                    print(f"  [{stamp}] [{name}]{pid} {event['e']}{data}")
+                summary = ", ".join(f"{name} {count}" for name, count in sorted(result["by_event"].items()))
+                print(f"  {result['count']} event(s){': ' + summary if summary else ''}")
+            elif cmd == "shutdown":
+                print(f"{YELLOW}Shutting down taskmaster...{RESET}")
+            elif cmd == "ping":
+                state = "ready" if result["ready"] else "starting"
+                print(f"{GREEN}taskmaster (PID {result['pid']}) is {state}.{RESET}")
+            else:
+                print(json.dumps(result, indent=2))
+
+        def run(self, request):
+            if request["cmd"] == "attach":
+                response, sock = self.client.attach(request)
+                if sock is None:
+                    self.render(request, response)
+                    return False
+                console_session(sock)
+                return True
+            response = self.client.request(request)
+            self.render(request, response)
+            return response.get("ok", False)
+
+        def command_input(self):
+            print("\n" + "="*50)
+            print("Taskmaster Control Client")
+            print("="*50)
+            print("Type 'help' for commands\n")
+
+            while True:
+                try:
+                    inpt = input("taskmaster> ").strip()
+                    if inpt == "":
+                        continue
+                    if inpt in ("quit", "exit"):
+                        break
+                    if inpt == "help":
+                        self.cmd_help()
+                        continue
+                    request = parse_command(inpt)
+                    if request["cmd"] in PROGRAM_COMMANDS and not request["programs"]:
+                        print(f"{RED}Error: No program specified for '{request['cmd']}' command.{RESET}")
+                        continue
+                    self.run(request)
+                    if request["cmd"] == "shutdown":
+                        break
+                except ValueError as e:
+                    print(f"{RED}Error: {e}{RESET}")
+                except ConnectionError as e:
+                    print(f"{RED}Error: {e}{RESET}")
+                    break
+                except KeyboardInterrupt:
+                    print(f"\n{YELLOW}Use 'quit' to exit{RESET}")
+                except EOFError:
+                    print()
+                    break
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="TaskMaster control client")
+    parser.add_argument("-s", "--socket", default=SOCKFILE, help="control socket path")
+    parser.add_argument("--json", action="store_true", help="print raw JSON responses")
+    parser.add_argument("--batch", action="store_true",
+                        help="send every command argument (or stdin line) as one batched request")
+    parser.add_argument("command", nargs=argparse.REMAINDER, help="command to run; omit for the interactive shell")
+    args = parser.parse_args()
+
+    client = ControlClient(args.socket)
+    shell = ClientShell(client, as_json=args.json)
+    try:
+        client.connect()
+    except OSError as e:
+        print(f"{RED}Error: cannot connect to {args.socket}: {e}{RESET}")
+        sys.exit(2)
+
+    if args.batch:
+        lines = args.command or [line for line in sys.stdin.read().splitlines() if line.strip()]
+        requests = [parse_command(line) for line in lines]
+        response = client.batch(requests)
+        if args.json:
+            print(json.dumps(response, indent=2))
+        else:
+            for request, entry in zip(requests, response["results"]):
+                shell.render(request, entry)
+        sys.exit(0 if response.get("ok") else 1)
+    elif args.command:
+        try:
+            request = parse_command(shlex.join(args.command))
+        except ValueError as e:
+            print(f"{RED}Error: {e}{RESET}")
+            sys.exit(2)
+        ok = shell.run(request)
+        sys.exit(0 if ok else 1)
+    else:
+        shell.command_input()
+    client.close()
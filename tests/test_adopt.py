@@ -0,0 +1,85 @@
+import os
+import sys
+import json
+import time
+import shutil
+import signal
+import socket
+import tempfile
+import unittest
+import subprocess
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+CONFIG = """
+taskmaster:
+  socket: {workdir}/taskmaster.sock
+  state_file: {workdir}/taskmaster.state
+  events_dir: {workdir}/events
+programs:
+  sleeper:
+    cmd: "sleep 300"
+    autostart: true
+    capture: false
+"""
+
+
+def wait_for(predicate, timeout=10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.05)
+    return False
+
+
+class AdoptEventsTest(unittest.TestCase):
+
+        def setUp(self):
+            self.workdir = tempfile.mkdtemp(prefix="taskmaster-test-")
+            self.config = os.path.join(self.workdir, "conf.yaml")
+            with open(self.config, "w") as handle:
+                handle.write(CONFIG.format(workdir=self.workdir))
+            self.daemon = None
+            self.child = None
+
+        def tearDown(self):
+            if self.daemon is not None and self.daemon.poll() is None:
+                self.daemon.send_signal(signal.SIGTERM)
+                self.daemon.wait(20)
+            if self.child is not None:
+                try:
+                    os.kill(self.child, signal.SIGKILL)
+                except ProcessLookupError:
+                    pass
+            shutil.rmtree(self.workdir, ignore_errors=True)
+
+        def launch(self, *flags):
+            ready = os.path.join(self.workdir, "ready")
+            if os.path.exists(ready):
+                os.unlink(ready)
+            self.daemon = subprocess.Popen(
+                [sys.executable, os.path.join(ROOT, "TaskMaster.py"), "--headless",
+                 "-c", self.config, "--ready-file", ready, *flags],
+                cwd=self.workdir, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            self.assertTrue(wait_for(lambda: os.path.exists(ready)), "supervisor never became ready")
+
+        def request(self, payload):
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+                client.connect(os.path.join(self.workdir, "taskmaster.sock"))
+                client.sendall(json.dumps(payload).encode() + b"\n")
+                return json.loads(client.makefile().readline())
+
+        def test_adopted_event_is_journaled(self):
+            self.launch("--keep-children")
+            self.child = self.request({"cmd": "status"})["result"][0]["instances"][0]["pid"]
+            self.daemon.send_signal(signal.SIGTERM)
+            self.daemon.wait(20)
+            self.launch("--adopt")
+            result = self.request({"cmd": "events", "program": "sleeper"})["result"]
+            adopted = [event for event in result["events"] if event["e"] == "Adopted"]
+            self.assertEqual([event["pid"] for event in adopted], [self.child])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,52 @@
+import os
+import sys
+import time
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import TaskMaster
+
+
+def open_fds():
+    return len(os.listdir("/proc/self/fd"))
+
+
+class ConsoleRespawnTest(unittest.TestCase):
+
+        def setUp(self):
+            self.mux = TaskMaster.ConsoleMux()
+
+        def tearDown(self):
+            self.mux.close()
+
+        def test_respawn_closes_previous_master(self):
+            slave = self.mux.open("web", 1)
+            os.close(slave)
+            time.sleep(0.1)
+            baseline = open_fds()
+            for _ in range(10):
+                slave = self.mux.open("web", 1)
+                time.sleep(0.02)
+                os.write(slave, b"line\n")
+                os.close(slave)
+            time.sleep(0.3)
+            self.assertLessEqual(open_fds(), baseline)
+            self.assertEqual(bytes(self.mux.scrollbacks[("web", 1)]).count(b"line"), 10)
+
+        def test_stale_master_does_not_spin(self):
+            old = self.mux.open("web", 1)
+            time.sleep(0.1)
+            os.write(old, b"late\n")
+            new = self.mux.open("web", 1)
+            os.close(old)
+            time.sleep(0.3)
+            started = time.process_time()
+            time.sleep(0.5)
+            self.assertLess(time.process_time() - started, 0.2)
+            self.assertIn(b"late", bytes(self.mux.scrollbacks[("web", 1)]))
+            os.close(new)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,92 @@
+import os
+import sys
+import time
+import shutil
+import signal
+import socket
+import tempfile
+import unittest
+import subprocess
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+CONFIG = """
+taskmaster:
+  socket: {socket}
+  state_file: null
+  events_dir: null
+programs:
+  sleeper:
+    cmd: "sleep 300"
+    autostart: false
+"""
+
+
+def wait_for(predicate, timeout=10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.05)
+    return False
+
+
+class ControlSocketTest(unittest.TestCase):
+
+        def setUp(self):
+            self.workdir = tempfile.mkdtemp(prefix="taskmaster-test-")
+            self.config = os.path.join(self.workdir, "conf.yaml")
+            self.socket = os.path.join(self.workdir, "taskmaster.sock")
+            with open(self.config, "w") as handle:
+                handle.write(CONFIG.format(socket=self.socket))
+            self.daemons = []
+
+        def tearDown(self):
+            for daemon in self.daemons:
+                if daemon.poll() is None:
+                    daemon.send_signal(signal.SIGTERM)
+                    daemon.wait(20)
+                daemon.stderr.close()
+            shutil.rmtree(self.workdir, ignore_errors=True)
+
+        def launch(self):
+            ready = os.path.join(self.workdir, f"ready-{len(self.daemons)}")
+            daemon = subprocess.Popen(
+                [sys.executable, os.path.join(ROOT, "TaskMaster.py"), "--headless",
+                 "-c", self.config, "--ready-file", ready],
+                cwd=self.workdir, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+            self.daemons.append(daemon)
+            return daemon, ready
+
+        def ping(self):
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+                client.connect(self.socket)
+                client.sendall(b'{"cmd": "ping"}\n')
+                return b'"ok": true' in client.recv(4096)
+
+        def test_refuses_socket_of_running_supervisor(self):
+            first, ready = self.launch()
+            self.assertTrue(wait_for(lambda: os.path.exists(ready)))
+            second, _ = self.launch()
+            self.assertEqual(second.wait(20), 1)
+            self.assertIn(b"already listening", second.stderr.read())
+            self.assertIsNone(first.poll())
+            self.assertTrue(self.ping())
+
+        def test_replaces_stale_socket(self):
+            stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            stale.bind(self.socket)
+            stale.close()
+            daemon, ready = self.launch()
+            self.assertTrue(wait_for(lambda: os.path.exists(ready)), daemon.stderr.read() if daemon.poll() else "")
+            self.assertTrue(self.ping())
+
+        def test_refuses_non_socket_path(self):
+            open(self.socket, "w").close()
+            daemon, _ = self.launch()
+            self.assertEqual(daemon.wait(20), 1)
+            self.assertTrue(os.path.isfile(self.socket))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,120 @@
+import os
+import sys
+import time
+import shutil
+import signal
+import tempfile
+import unittest
+import subprocess
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+CONFIG = """
+taskmaster:
+  socket: {socket}
+  state_file: null
+  events_dir: null
+programs:
+  sleeper:
+    cmd: "sleep 300"
+    autostart: true
+{extra}
+"""
+
+
+def wait_for(predicate, timeout=10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.05)
+    return False
+
+
+def alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    return True
+
+
+def children(pid):
+    with open(f"/proc/{pid}/task/{pid}/children") as handle:
+        return [int(child) for child in handle.read().split()]
+
+
+class InvalidReloadTest(unittest.TestCase):
+
+        def setUp(self):
+            self.workdir = tempfile.mkdtemp(prefix="taskmaster-test-")
+            self.config = os.path.join(self.workdir, "conf.yaml")
+            self.ready = os.path.join(self.workdir, "ready")
+            self.socket = os.path.join(self.workdir, "taskmaster.sock")
+            self.write_config()
+            self.daemon = subprocess.Popen(
+                [sys.executable, os.path.join(ROOT, "TaskMaster.py"), "--headless",
+                 "-c", self.config, "--ready-file", self.ready],
+                cwd=self.workdir, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+            self.assertTrue(wait_for(lambda: os.path.exists(self.ready)), "supervisor never became ready")
+
+        def tearDown(self):
+            if self.daemon.poll() is None:
+                self.daemon.send_signal(signal.SIGTERM)
+                self.daemon.wait(20)
+            self.daemon.stderr.close()
+            shutil.rmtree(self.workdir, ignore_errors=True)
+
+        def write_config(self, extra=""):
+            with open(self.config, "w") as handle:
+                handle.write(CONFIG.format(socket=self.socket, extra=extra))
+
+        def assert_survives_reload(self, extra):
+            self.assertTrue(wait_for(lambda: children(self.daemon.pid)))
+            child = children(self.daemon.pid)[0]
+            self.write_config(extra)
+            self.daemon.send_signal(signal.SIGHUP)
+            with open(os.path.join(self.workdir, "logs.log")) as handle:
+                self.assertTrue(wait_for(lambda: "Configuration reload failed" in handle.read()))
+            self.assertIsNone(self.daemon.poll(), self.daemon.stderr.read().decode() if self.daemon.poll() else "")
+            self.assertTrue(alive(child))
+            self.assertEqual(children(self.daemon.pid), [child])
+
+        def test_invalid_healthcheck_keeps_daemon_and_children(self):
+            self.assert_survives_reload("    healthcheck: {type: carrier-pigeon}")
+
+        def test_invalid_console_keeps_daemon_and_children(self):
+            self.assert_survives_reload("    console: serial")
+
+        def test_invalid_program_entry_keeps_daemon_and_children(self):
+            self.assert_survives_reload("  other: [not, a, mapping]")
+
+        def test_invalid_yaml_keeps_daemon_and_children(self):
+            self.assert_survives_reload("  broken: [unterminated")
+
+        def test_valid_reload_after_failure(self):
+            self.assert_survives_reload("    console: serial")
+            self.write_config("    stoptime: 3")
+            self.daemon.send_signal(signal.SIGHUP)
+            with open(os.path.join(self.workdir, "logs.log")) as handle:
+                self.assertTrue(wait_for(lambda: "Configuration Reloaded" in handle.read()))
+            self.assertIsNone(self.daemon.poll())
+
+
+class InvalidStartupConfigTest(unittest.TestCase):
+
+        def test_invalid_program_is_reported(self):
+            with tempfile.TemporaryDirectory(prefix="taskmaster-test-") as workdir:
+                config = os.path.join(workdir, "conf.yaml")
+                with open(config, "w") as handle:
+                    handle.write(CONFIG.format(socket=os.path.join(workdir, "taskmaster.sock"),
+                                               extra="    healthcheck: {type: exec}"))
+                result = subprocess.run([sys.executable, os.path.join(ROOT, "TaskMaster.py"), "--headless",
+                                         "-c", config], cwd=workdir, capture_output=True, timeout=20)
+            self.assertEqual(result.returncode, 1)
+            self.assertIn("program 'sleeper': exec healthcheck needs a command", result.stderr.decode())
+            self.assertNotIn("Traceback", result.stderr.decode())
+
+
+if __name__ == "__main__":
+    unittest.main()